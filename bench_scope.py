@@ -0,0 +1,83 @@
+"""Benchmark of the host scope matcher used by create_full_link().
+
+Generates synthetic absolute hrefs - internal subdomains, look-alike and unrelated hosts -
+and measures the scope check alone and whole create_full_link() per href.
+
+Usage: python3 bench_scope.py [count]
+"""
+import random
+import sys
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from script import CrawlContext, create_full_link, parse_arguments
+
+SEED = "https://www.shop.com"
+HOSTS = (
+    "www.shop.com",
+    "shop.com",
+    "img.shop.com",
+    "a.b.c.shop.com",
+    "shopping-ads.net",
+    "www.shop.com.evil.org",
+    "cdn.example.co.uk",
+    "static.othershop.com",
+)
+
+
+def make_hrefs(count: int) -> list:
+    """Returns <count> random absolute hrefs.
+
+    Arguments:
+        count {int} -- number of hrefs
+
+    Returns:
+        list -- list of hrefs
+    """
+    rnd = random.Random(0)
+    return [
+        f"https://{rnd.choice(HOSTS)}/category/{rnd.randrange(1000)}/item-{i}"
+        for i in range(count)
+    ]
+
+
+def legacy_is_internal(hostname: str, netloc: str) -> bool:
+    """Substring check used by create_full_link() before the scope matcher, for comparison."""
+    parts = urlsplit(hostname).netloc.split(sep=".")
+    return any(part in netloc for part in parts[1:-1])
+
+
+def measure(name: str, func, items: list) -> None:
+    """Prints time per item spent in <func>."""
+    start = perf_counter()
+    for item in items:
+        func(item)
+    elapsed = perf_counter() - start
+    print(f"{name}: {elapsed:.2f} s total, {elapsed / len(items) * 1e9:.0f} ns per href")
+
+
+def main() -> None:
+    """Main func.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    hrefs = make_hrefs(count)
+    hosts = [urlsplit(href).hostname for href in hrefs]
+    netlocs = [urlsplit(href).netloc for href in hrefs]
+    print(f"{count} hrefs, seed: {SEED}")
+
+    for scope in ("exact", "domain"):
+        context = CrawlContext(SEED, parse_arguments(["--scope", scope, SEED]))
+        internal = sum(context.is_internal_host(host) for host in hosts)
+        print(f"scope '{scope}': {internal} internal")
+        measure(f"  scope check ({scope})", context.is_internal_host, hosts)
+        measure(
+            f"  create_full_link ({scope})",
+            lambda href, context=context: create_full_link(context, href),
+            hrefs,
+        )
+
+    measure("legacy substring check", lambda netloc: legacy_is_internal(SEED, netloc), netlocs)
+
+
+if __name__ == "__main__":
+    main()
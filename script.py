@@ -1,15 +1,57 @@
+import argparse
+import asyncio
+import codecs
 import csv
+import fnmatch
+import gzip
+import hashlib
+import ipaddress
+import json
+import math
+import os
+import pickle
+import queue
+import random
+import re
 import signal
+import sqlite3
 import sys
+import threading
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from functools import partial
+from itertools import chain
 from datetime import datetime as dt
 from datetime import timedelta
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from multiprocessing import TimeoutError as PoolTimeoutError
 from multiprocessing import get_context
+from multiprocessing.managers import BaseManager
+from multiprocessing.pool import Pool
 from pprint import PrettyPrinter
-from time import sleep
-from typing import Any, Optional, Set, Tuple, Union
-from urllib.parse import urljoin, urlsplit
+from time import monotonic, sleep, time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import urljoin, urlsplit, urlunsplit
 
 import requests as r
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
 # pyre-ignore
 from bs4 import BeautifulSoup
@@ -17,10 +59,138 @@ from bs4 import BeautifulSoup
 # pyre-ignore
 from colorama import Fore, init
 
+# pyre-ignore
+import soupsieve
+
+# pyre-ignore
+from lxml import etree
+
+try:
+    # pyre-ignore
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    # pyre-ignore
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+    pq = None
+
+ENGINES = ("pool", "persistent", "async", "pipeline")
+OUTPUT_FORMATS = ("csv", "jsonl", "sqlite", "parquet")
+OUTPUT_EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "sqlite": "sqlite3", "parquet": "parquet"}
+SCHEDULERS = ("level", "stream")
+EXTRACTORS = ("soup", "fast", "stream")
+TRAILING_SLASH_POLICIES = ("keep", "add", "strip")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+DUPLICATE_SLASHES = re.compile(r"/{2,}")
+DIGITS = re.compile(r"\d+")
+SCOPES = ("exact", "domain", "allowlist")
+PUBLIC_SUFFIX_LIST = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "public_suffix_list.dat"
+)
+QUERY_POLICIES = ("keep", "drop")
+DEFAULT_DENIED_PARAMS = (
+    "utm_*",
+    "gclid",
+    "fbclid",
+    "msclkid",
+    "yclid",
+    "_ga",
+    "mc_cid",
+    "mc_eid",
+    "sessionid",
+    "session_id",
+    "sid",
+    "phpsessid",
+    "jsessionid",
+    "aspsessionid*",
+)
+CHUNK_SIZE = 16384
+BACKOFF_STATUS_CODES = (429, 503)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRYABLE_ERRORS = (r.exceptions.ConnectionError, r.exceptions.Timeout, r.exceptions.ChunkedEncodingError)
+# visited link, response time, response status code (0 without response),
+# number of attempts, class name of the error (None if there was none)
+# and number of downloaded bytes of the body
+PageStats = Tuple[str, timedelta, int, int, Optional[str], int]
+
+
+_shutdown_deadline: Optional[float] = None
+_shutdown_event: Any = None
+
+
+def set_shutdown_event(event: Any) -> None:
+    """Sets multiprocessing Event shared by the worker processes, which is set
+    by request_shutdown(), so the workers do not fetch links queued before the shutdown.
+
+    Arguments:
+        event {Any} -- multiprocessing.Event object, None if there are no worker processes
+    """
+    global _shutdown_event  # pylint: disable=global-statement
+    _shutdown_event = event
+
+
+def get_shutdown_event() -> Any:
+    """Returns multiprocessing Event set on shutdown of the crawl.
+
+    Returns:
+        Any -- multiprocessing.Event object or None
+    """
+    return _shutdown_event
+
+
+def request_shutdown(timeout: float) -> None:
+    """Stops scheduling of new links, links in flight are waited for up to <timeout> seconds.
+
+    Arguments:
+        timeout {float} -- seconds to wait for links in flight
+    """
+    global _shutdown_deadline  # pylint: disable=global-statement
+    _shutdown_deadline = monotonic() + timeout
+    if _shutdown_event is not None:
+        _shutdown_event.set()
+
+
+def is_shutting_down() -> bool:
+    """Returns True, if the shutdown of the crawl was requested,
+    in worker process also by the main process.
+
+    Returns:
+        bool -- True after request_shutdown()
+    """
+    return (_shutdown_deadline is not None) or (
+        _shutdown_event is not None and _shutdown_event.is_set()
+    )
+
+
+def drain_time_left() -> Optional[float]:
+    """Returns seconds left to wait for links in flight during shutdown.
+
+    Returns:
+        Optional[float] -- seconds, 0 after the deadline, None if not shutting down
+    """
+    if _shutdown_deadline is None:
+        return None
+    return max(_shutdown_deadline - monotonic(), 0.0)
+
+
+def reset_shutdown() -> None:
+    """Forgets the shutdown of the previous crawl, so the next crawl in the same process runs."""
+    global _shutdown_deadline, _shutdown_event  # pylint: disable=global-statement
+    _shutdown_deadline = None
+    _shutdown_event = None
+
 
 # pylint:disable=unused-argument
 def signal_handler(signum: int, stack_frame: Any) -> None:
-    """Cleanly exits the running script without ugly stacktrace in the console.
+    """Stops the crawl gracefully on the first SIGINT: no new links are scheduled,
+    links in flight are waited for up to --drain-timeout seconds and results collected
+    so far are saved. Cleanly exits the running script without ugly stacktrace
+    in the console on the second SIGINT.
 
     Arguments:
         signum {int} -- signal.SIGINT number
@@ -29,10 +199,25 @@ def signal_handler(signum: int, stack_frame: Any) -> None:
     See:
         https://docs.python.org/3/library/signal.html#signal.signal
     """
+    if not is_shutting_down():
+        timeout = get_crawl_context().options.drain_timeout
+        print(
+            f"\rStopping the crawl, waiting up to {timeout:g} s for pages in flight. "
+            "Press Ctrl-C again to terminate immediately."
+        )
+        request_shutdown(timeout)
+        return
     print("\rYou terminated the script execution.")
     sys.exit(0)
 
 
+def ignore_sigint() -> None:
+    """Ignores SIGINT in worker process, so only the main process handles Ctrl-C
+    and the pages in flight can be finished.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
 def start_sigint_catching() -> None:
     """Sets the handling function for SIGINT.
 
@@ -145,297 +330,4677 @@ def color_response_time(time_: timedelta) -> str:
     return color_red(str(time_))
 
 
-def get_hostname() -> str:
-    """Returns provided URL hostname as sys.argv[1]
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Returns parsed command line arguments.
+
+    Keyword Arguments:
+        argv {Optional[List[str]]} -- arguments to parse, defaults to sys.argv[1:] (default: {None})
 
     Returns:
-        str -- URL hostname, e.g. https://www.ihned.cz
+        argparse.Namespace -- parsed arguments
     """
-    try:
-        return sys.argv[1]
-    except IndexError as e:
-        print(
-            f"You have to provide hostname URL, e.g. https://www.ihned.cz.\nError: {str(e)}"
-        )
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Simple website crawler. Returns all internal links it can find."
+    )
+    parser.add_argument("hostname", help="URL hostname, e.g. https://www.ihned.cz")
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pool",
+        help="crawl engine: 'pool' runs one process per URL, "
+        "'persistent' runs long-lived worker processes shared by all crawl levels, "
+        "'async' runs concurrent fetches on one asyncio event loop, "
+        "'pipeline' runs fetch threads feeding pool of parse processes (default: pool)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes of the 'persistent' engine "
+        "or parse processes of the 'pipeline' engine (default: cpu count)",
+    )
+    parser.add_argument(
+        "--fetchers",
+        type=int,
+        default=32,
+        help="number of fetch threads of the 'pipeline' engine (default: 32)",
+    )
+    parser.add_argument(
+        "--parse-queue-size",
+        type=int,
+        default=64,
+        help="max. number of fetched pages waiting for the parse processes of the 'pipeline' engine, "
+        "fetch threads wait when it is full (default: 64)",
+    )
+    parser.add_argument(
+        "--scheduler",
+        choices=SCHEDULERS,
+        default="level",
+        help="scheduler of the 'persistent' engine: 'level' scans the site level by level, "
+        "'stream' schedules newly found links as soon as any page is done (default: level)",
+    )
+    parser.add_argument(
+        "--extractor",
+        choices=EXTRACTORS,
+        default="soup",
+        help="link extractor: 'soup' selects links from BeautifulSoup tree, "
+        "'fast' collects them from lxml parser events without building the tree, "
+        "'stream' does the same while the page is downloading (default: soup)",
+    )
+    parser.add_argument(
+        "--scope",
+        choices=SCOPES,
+        default="domain",
+        help="hosts considered internal: 'exact' only the host of the URL, "
+        "'domain' its registrable domain with all subdomains, e.g. *.ihned.cz, "
+        "'allowlist' the host of the URL and --allow-host ones (default: domain)",
+    )
+    parser.add_argument(
+        "--allow-host",
+        action="append",
+        default=[],
+        metavar="HOST",
+        help="host considered internal, '*.' prefix includes its subdomains, can be repeated",
+    )
+    parser.add_argument(
+        "--trailing-slash",
+        choices=TRAILING_SLASH_POLICIES,
+        default="keep",
+        help="normalization of trailing slash of found links: 'add' appends it to paths "
+        "without file extension, 'strip' removes it (default: keep)",
+    )
+    parser.add_argument(
+        "--query",
+        choices=QUERY_POLICIES,
+        default="keep",
+        help="query strings of found links: 'keep' keeps them with sorted parameters "
+        "without tracking and session ones, 'drop' removes them (default: keep)",
+    )
+    parser.add_argument(
+        "--allow-param",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="keep only query parameters matching this glob pattern, can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--deny-param",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="remove query parameters matching this glob pattern, can be repeated; "
+        f"added to: {', '.join(DEFAULT_DENIED_PARAMS)}",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=20,
+        help="skip links with more path segments, 0 disables the check (default: 20)",
+    )
+    parser.add_argument(
+        "--max-segment-repeats",
+        type=int,
+        default=3,
+        help="skip links with the same path segment repeated more times, "
+        "0 disables the check (default: 3)",
+    )
+    parser.add_argument(
+        "--max-template-urls",
+        type=int,
+        default=0,
+        help="max. number of links per path template, where numbers are replaced "
+        "by placeholder, e.g. /calendar/{n}/{n}, 0 disables the check (default: 0)",
+    )
+    parser.add_argument(
+        "--max-query-variants",
+        type=int,
+        default=1000,
+        help="max. number of different query strings per path, 0 disables the check (default: 1000)",
+    )
+    parser.add_argument(
+        "--compact-visited",
+        action="store_true",
+        help="keep only 64-bit fingerprints of visited links in memory instead of the whole URLs",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="PATH",
+        help="keep the frontier and visited links in SQLite database at PATH instead of memory, "
+        "for crawls larger than RAM",
+    )
+    parser.add_argument(
+        "--store-cache",
+        type=int,
+        default=100_000,
+        help="number of links of each frontier and of the visited links kept in memory "
+        "with --store (default: 100000)",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="PATH",
+        help="path to output file with found URLs stats, written while crawling "
+        "(default: <timestamp>_scanned_links.<format>)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="format of output file: 'csv' with response time as text, 'jsonl', 'sqlite' "
+        "and 'parquet' (requires pyarrow) with response time in milliseconds (default: csv)",
+    )
+    parser.add_argument(
+        "--output-buffer",
+        type=int,
+        default=100,
+        help="number of found URLs stats written into output file at once (default: 100)",
+    )
+    parser.add_argument(
+        "--fsync-every",
+        type=float,
+        default=10.0,
+        help="seconds between forcing output file to the disk (default: 10)",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30.0,
+        help="seconds to wait for pages in flight after the first Ctrl-C "
+        "or when a crawl budget is exceeded (default: 30)",
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=0,
+        help="stop the crawl gracefully after N visited links, 0 means no limit (default: 0)",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=0,
+        help="stop the crawl gracefully after N downloaded bytes of page bodies, "
+        "0 means no limit (default: 0)",
+    )
+    parser.add_argument(
+        "--max-time",
+        type=float,
+        default=0.0,
+        help="stop the crawl gracefully after SECONDS of wall time, 0 means no limit (default: 0)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        help="periodically save the frontier, visited links and stats into checkpoint file at PATH",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=float,
+        default=300.0,
+        help="seconds between checkpoints (default: 300)",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="PATH",
+        help="resume the crawl from checkpoint file at PATH, "
+        "new checkpoints are saved into it too, unless --checkpoint is set",
+    )
+    parser.add_argument(
+        "--bloom",
+        action="store_true",
+        help="check links in Bloom filter before the set of visited links, "
+        "only possibly visited links are looked up in the set",
+    )
+    parser.add_argument(
+        "--worker-bloom",
+        action="store_true",
+        help="workers of the 'persistent' and 'pipeline' engines do not return links they already "
+        "returned, checked by Bloom filter; a link is lost with --bloom-error probability",
+    )
+    parser.add_argument(
+        "--bloom-capacity",
+        type=int,
+        default=1_000_000,
+        help="expected number of links in Bloom filters (default: 1000000)",
+    )
+    parser.add_argument(
+        "--bloom-error",
+        type=float,
+        default=0.001,
+        help="false positive rate of Bloom filters at --bloom-capacity links (default: 0.001)",
+    )
+    parser.add_argument(
+        "--incremental",
+        metavar="PATH",
+        help="recrawl incrementally with page index in SQLite database at PATH: pages are requested "
+        "with ETag and Last-Modified of the previous crawl, links of not modified pages are reused",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="cache responses in directory DIR and use them instead of requests to the site",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=1024.0,
+        help="max. size of cached compressed bodies in MB, least recently used are evicted "
+        "(default: 1024)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=86400.0,
+        help="seconds, for which cached response is used (default: 86400)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=60.0,
+        help="seconds to wait for connection to the host (default: 60)",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=120.0,
+        help="seconds to wait for the response or the next chunk of its body (default: 120)",
+    )
+    parser.add_argument(
+        "--page-timeout",
+        type=float,
+        default=0.0,
+        help="seconds of one attempt to fetch a page including download of its body, "
+        "0 means no limit (default: 0)",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="max. number of attempts to fetch page failed by connection error, timeout "
+        "or retryable response status (default: 3)",
+    )
+    parser.add_argument(
+        "--retry-status",
+        type=int,
+        action="append",
+        metavar="CODE",
+        help="response status, which is retried, can be repeated "
+        "(default: 429, 500, 502, 503, 504)",
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=0.5,
+        help="base of exponential backoff between attempts in seconds, "
+        "actual delay is random up to base * 2 ** (attempt - 1) (default: 0.5)",
+    )
+    parser.add_argument(
+        "--retry-max-backoff",
+        type=float,
+        default=30.0,
+        help="max. backoff between attempts in seconds (default: 30)",
+    )
+    parser.add_argument(
+        "--breaker-failures",
+        type=int,
+        default=5,
+        help="consecutive failures of a host, after which its requests are short-circuited, "
+        "0 disables the circuit breaker (default: 5)",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=60.0,
+        help="seconds, for which requests to a host are short-circuited (default: 60)",
+    )
+    parser.add_argument(
+        "--head-first",
+        action="store_true",
+        help="send HEAD request to check the content-type before GET request "
+        "(default: one streamed GET request)",
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=5.0,
+        help="max. number of requests per second sent to one host by all workers together, "
+        "0 disables the limit (default: 5.0)",
+    )
+    parser.add_argument(
+        "--host-burst",
+        type=int,
+        default=5,
+        help="max. number of requests sent to one host at once before --host-rate applies (default: 5)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="adapt number of in-flight requests of the 'async' engine and 'stream' scheduler "
+        "to observed response times and 429/503 responses (default: fixed)",
+    )
+    parser.add_argument(
+        "--min-concurrency",
+        type=int,
+        default=1,
+        help="min. number of in-flight requests with --adaptive (default: 1)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=100,
+        help="max. number of concurrent fetches of the 'async' engine (default: 100)",
+    )
+    return parser.parse_args(argv)
 
 
-def start_session() -> r.Session:
-    """Returns requests module Session object
+_arguments: Optional[argparse.Namespace] = None
+
+
+def get_arguments() -> argparse.Namespace:
+    """Returns command line arguments parsed from sys.argv.
+
+    Arguments are parsed only once and cached for the lifetime of the process.
 
     Returns:
-        {r.Session} -- requests.Session() object
+        argparse.Namespace -- parsed arguments
     """
-    return r.Session()
+    global _arguments  # pylint: disable=global-statement
+    if _arguments is None:
+        _arguments = parse_arguments()
+    return _arguments
 
 
-def close_session(session: r.Session) -> None:
-    """Closes requests.Session() session.
+def remove_dot_segments(path: str) -> str:
+    """Returns <path> with resolved '.' and '..' segments.
 
     Arguments:
-        session {r.Session()} -- requests.Session() object
+        path {str} -- absolute path of URL
+
+    Returns:
+        str -- path without dot segments
+
+    See:
+        https://tools.ietf.org/html/rfc3986#section-5.2.4
     """
-    session.close()
+    if ("/." not in path) and (not path.startswith(".")):
+        return path
 
+    output: List[str] = []
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+
+    if path.endswith(("/.", "/..")):
+        output.append("")
+    return "/".join(output)
 
-def cook_soup(url: str, session: r.Session) -> Tuple[Any, Tuple[str, timedelta, int]]:
-    """Returns parsed HTML content of web page on provided <url> as <BeautifulSoup> object
-    and response statistics of <url> visited.
+
+def compile_param_patterns(patterns: Sequence[str]) -> Optional[Pattern]:
+    """Returns one case insensitive regex matching query parameter names by glob <patterns>.
 
     Arguments:
-        url {str} -- url to page to parse
-        session {r.Session} -- requests.Session() object
+        patterns {Sequence[str]} -- glob patterns, e.g. 'utm_*'
 
     Returns:
-        Tuple[Any, Tuple[str, timedelta, int]] -- parsed content of the page as BeautifulSoup() object
-        and response statistics of <url> visited
+        Optional[Pattern] -- compiled regex, None for no patterns
     """
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns), re.I)
 
-    def dummy(status_code: int) -> Tuple[r.Response, Any]:
-        response = r.Response()
-        response.elapsed = timedelta(seconds=0)
-        response.status_code = status_code
-        soup = BeautifulSoup("<html></html>", "lxml")
-        return (response, soup)
 
-    def color_print(url: str, response_: r.Response) -> None:
-        print(
-            "URL: '{}' :: it took: '{}' :: response status: '{}'".format(
-                color_blue(url),
-                color_response_time(response_.elapsed),
-                color_response_status(str(response_.status_code)),
-            )
-        )
+class QueryPolicy:
+    """Normalizes query strings of found links before deduplication.
 
-    headers = session.head(url).headers
-    dummy_ = None
-    response = r.Response()
-    soup = BeautifulSoup("", "lxml")
+    Removes denied (tracking, session) parameters, keeps only allowed ones if any are set,
+    and sorts the rest, so the variants of the same page have the same URL.
+    """
 
-    try:
-        if ("text" in headers["content-type"].lower()) or (
-            "html" in headers["content-type"].lower()
-        ):
-            try:
-                response = session.get(url, timeout=(60, 120))
-                soup = BeautifulSoup(response.text, "lxml")
-            except Exception as e:
-                print(f"Func 'cook_soup': Exception encountered: {str(e)}")
-                dummy_ = dummy(400)
-        else:
-            dummy_ = dummy(418)
-    except KeyError as e:
-        print(f"Func 'cook_soup': Exception encountered: {str(e)}")
-        dummy_ = dummy(400)
+    def __init__(
+        self,
+        mode: str = "keep",
+        allowed: Sequence[str] = (),
+        denied: Sequence[str] = DEFAULT_DENIED_PARAMS,
+    ) -> None:
+        """
+        Keyword Arguments:
+            mode {str} -- 'keep' or 'drop' query strings (default: {"keep"})
+            allowed {Sequence[str]} -- glob patterns of allowed parameter names, empty allows all (default: {()})
+            denied {Sequence[str]} -- glob patterns of denied parameter names (default: {DEFAULT_DENIED_PARAMS})
+        """
+        self.mode = mode
+        self.allowed = compile_param_patterns(allowed)
+        self.denied = compile_param_patterns(denied)
 
-    sleep(1)
+    def apply(self, query: str) -> str:
+        """Returns normalized <query>.
 
-    if dummy_:
-        color_print(url, dummy_[0])
-        return (dummy_[1], (url, dummy_[0].elapsed, dummy_[0].status_code))
+        Arguments:
+            query {str} -- query string without '?'
 
-    color_print(url, response)
-    return (soup, (url, response.elapsed, response.status_code))
+        Returns:
+            str -- normalized query string, empty if there is no parameter left
+        """
+        if (not query) or (self.mode == "drop"):
+            return ""
 
+        params = []
+        for param in query.split("&"):
+            if not param:
+                continue
+            name = param.partition("=")[0]
+            if (self.denied is not None) and self.denied.match(name):
+                continue
+            if (self.allowed is not None) and (not self.allowed.match(name)):
+                continue
+            params.append(param)
 
-def get_internal_links(
-    soup: Tuple[Any, Tuple[str, timedelta, int]]
-) -> Tuple[Set[str], Tuple[str, timedelta, int]]:
-    """Returns all internal links, which can be found in provided parsed page content, 
-    and response statistics of url visited.
+        params.sort(key=lambda param: param.partition("="))
+        return "&".join(params)
 
-    Links are selected via this css filters:
 
-        'a[href^="{get_hostname()}"], a[href^="/"]'
+def canonicalize_url(
+    url: str, trailing_slash: str = "keep", query_policy: Optional[QueryPolicy] = None
+) -> Optional[str]:
+    """Returns canonical form of <url>, so the same page is visited only once,
+    or None, if <url> is malformed.
+
+    Lowercases scheme and host, drops default port, collapses duplicate slashes,
+    resolves dot segments and strips fragment. Trailing slash of the path is kept,
+    added to paths without file extension or stripped by <trailing_slash> policy.
+    Query string is normalized by <query_policy>, if provided.
 
     Arguments:
-        soup {Tuple[Any, Tuple[str, timedelta, int]]} -- parsed page content 
-        and passed visited url statistics
+        url {str} -- full URL link
+
+    Keyword Arguments:
+        trailing_slash {str} -- 'keep', 'add' or 'strip' (default: {"keep"})
+        query_policy {Optional[QueryPolicy]} -- query string normalization (default: {None})
 
     Returns:
-        Tuple[Set[str], Tuple[str, timedelta, int]] -- set of internal hrefs (links)
-        and statistics of url visited
+        Optional[str] -- canonical URL
     """
-    output = []
-    base = get_hostname()
-    elements = soup[0].select(f'a[href^="{base}"], a[href^="/"]')
+    try:
+        split = urlsplit(url)
+    except ValueError:
+        # e.g. unclosed bracket of IPv6 address
+        return None
+    scheme = split.scheme.lower()
+    netloc = split.netloc.lower()
 
-    for element in elements:
-        output.append(element["href"])
+    try:
+        port = split.port
+    except ValueError:
+        # invalid port, netloc is only lowercased
+        pass
+    else:
+        if split.hostname is not None:
+            userinfo, _, _ = split.netloc.rpartition("@")
+            host = split.hostname
+            # IPv6 address has to stay in brackets
+            netloc = f"[{host}]" if ":" in host else host
+            if (port is not None) and (port != DEFAULT_PORTS.get(scheme)):
+                netloc = f"{netloc}:{port}"
+            if userinfo:
+                netloc = f"{userinfo}@{netloc}"
 
-    return (set(output), soup[1])
+    path = remove_dot_segments(DUPLICATE_SLASHES.sub("/", split.path))
+    if not path:
+        path = "/"
+    elif (trailing_slash == "strip") and (path != "/"):
+        path = path.rstrip("/") or "/"
+    elif (
+        (trailing_slash == "add")
+        and (not path.endswith("/"))
+        and ("." not in path.rsplit("/", 1)[-1])
+    ):
+        path = f"{path}/"
 
+    query = split.query if query_policy is None else query_policy.apply(split.query)
+    return urlunsplit((scheme, netloc, path, query, ""))
 
-def create_full_link(hostname: str, internal_link: str) -> Optional[str]:
-    """Returns full link from <hostname> and <internal_link> parts.
 
-    Uses urllib.parse.urljoin() method.
+class TrapDetector:
+    """Detects crawl traps - links generated without bound, e.g. by calendars or faceted search.
 
-    Arguments:
-        hostname {str} -- hostname part of URL
-        internal_link {str} -- part of URL parsed from webpage HTML code
+    Every link is checked once, before it is scheduled. Links with too deep path, repeated path
+    segments, or too many siblings with the same path template or path are skipped and recorded
+    with the reason in <skipped>.
+    """
 
-    Returns:
-        str -- full URL link
+    def __init__(
+        self,
+        max_depth: int = 20,
+        max_segment_repeats: int = 3,
+        max_template_urls: int = 0,
+        max_query_variants: int = 1000,
+    ) -> None:
+        """
+        Keyword Arguments:
+            max_depth {int} -- max. number of path segments, 0 disables the check (default: {20})
+            max_segment_repeats {int} -- max. occurrences of one path segment, 0 disables the check (default: {3})
+            max_template_urls {int} -- max. links per path template, 0 disables the check (default: {0})
+            max_query_variants {int} -- max. query strings per path, 0 disables the check (default: {1000})
+        """
+        self.max_depth = max_depth
+        self.max_segment_repeats = max_segment_repeats
+        self.max_template_urls = max_template_urls
+        self.max_query_variants = max_query_variants
+        self.skipped: Dict[str, str] = {}
+        self._templates: Counter = Counter()
+        self._query_variants: Counter = Counter()
+
+    def check(self, url: str) -> Optional[str]:
+        """Returns reason, why <url> is a crawl trap, or None if it is not.
+        Links which are not traps are counted to their template and path.
+
+        Arguments:
+            url {str} -- canonical URL
+
+        Returns:
+            Optional[str] -- 'max_depth', 'repeated_segment', 'template_cap', 'query_variants' or None
+        """
+        split = urlsplit(url)
+        segments = [segment for segment in split.path.split("/") if segment]
+
+        if self.max_depth and len(segments) > self.max_depth:
+            return "max_depth"
+        if (
+            self.max_segment_repeats
+            and segments
+            and max(Counter(segments).values()) > self.max_segment_repeats
+        ):
+            return "repeated_segment"
+
+        template = split.netloc + DIGITS.sub("{n}", split.path)
+        if self.max_template_urls and self._templates[template] >= self.max_template_urls:
+            return "template_cap"
+
+        path = split.netloc + split.path
+        if (
+            self.max_query_variants
+            and split.query
+            and self._query_variants[path] >= self.max_query_variants
+        ):
+            return "query_variants"
+
+        if self.max_template_urls:
+            self._templates[template] += 1
+        if self.max_query_variants and split.query:
+            self._query_variants[path] += 1
+        return None
+
+    def admit(self, url: str) -> bool:
+        """Returns True, if <url> should be scheduled. Crawl traps are recorded in <skipped>.
+
+        Arguments:
+            url {str} -- canonical URL
+
+        Returns:
+            bool -- True for links, which are not crawl traps
+        """
+        if url in self.skipped:
+            return False
+        reason = self.check(url)
+        if reason is not None:
+            self.skipped[url] = reason
+            return False
+        return True
+
+    def state(self) -> Dict[str, Dict[str, Any]]:
+        """Returns skipped links and counters of the detector as plain data, for checkpoint.
+
+        Returns:
+            Dict[str, Dict[str, Any]] -- state restorable by restore()
+        """
+        return {
+            "skipped": dict(self.skipped),
+            "templates": dict(self._templates),
+            "query_variants": dict(self._query_variants),
+        }
+
+    def restore(self, state: Dict[str, Dict[str, Any]]) -> None:
+        """Restores skipped links and counters of state().
+
+        Arguments:
+            state {Dict[str, Dict[str, Any]]} -- state returned by state()
+        """
+        self.skipped = dict(state["skipped"])
+        self._templates = Counter(state["templates"])
+        self._query_variants = Counter(state["query_variants"])
+
+
+class FingerprintSet:
+    """Memory-compact set of URLs, which keeps only their 64-bit fingerprints.
+
+    Fingerprints are stored in an open-addressing hash table backed by array('Q'),
+    which takes 11 to 22 bytes per URL instead of over a hundred for Python set of strings.
+    Two different URLs share a fingerprint with negligible probability (~1e-6 for 5M URLs),
+    the later one is then considered visited.
     """
-    hostname_split = urlsplit(hostname)
-    internal_link_split = urlsplit(internal_link)
 
-    # if found internal link has netloc part
-    # check, if this part of url contains some part
-    # of hostname netloc. If so, than consider it
-    # internal link and urljoin() full hostname and internal link
-    # that will use netloc part from internal link
-    # that is useful in case of big websites with subdomains
-    if internal_link_split.netloc != "":
-        parts = hostname_split.netloc.split(sep=".")
-        for part in parts[1:-1]:
-            if part in internal_link_split.netloc:
-                return urljoin(hostname, internal_link)
-        # pylint: disable=useless-else-on-loop
-        else:
-            return None
+    MAX_LOAD = 0.75
 
-    return urljoin(hostname, internal_link_split.path)
+    def __init__(self, capacity: int = 1024) -> None:
+        """
+        Keyword Arguments:
+            capacity {int} -- expected number of URLs (default: {1024})
+        """
+        size = 1
+        while size * self.MAX_LOAD < capacity:
+            size *= 2
+        # 0 marks empty slot
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._len = 0
 
+    @staticmethod
+    def fingerprint(url: str) -> int:
+        """Returns 64-bit fingerprint of <url>, stable across processes and runs.
 
-def process_page(
-    url: str, session: r.Session
-) -> Tuple[Set[str], Tuple[str, timedelta, int]]:
-    """Wraps several functions under one hood.
+        Arguments:
+            url {str} -- canonical URL
 
-    Visits URL, gets HTML, parses it, gets internal links, converts them to full links
-    and returns them as set.
+        Returns:
+            int -- non-zero fingerprint
+        """
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
 
-    Arguments:
-        url {str} -- URL to be scanned for links.
-        session {r.Session} -- requests.Session() object
+    def _slot(self, fingerprint: int) -> int:
+        table = self._table
+        mask = self._mask
+        index = fingerprint & mask
+        while table[index] not in (0, fingerprint):
+            index = (index + 1) & mask
+        return index
 
-    Returns:
-        Tuple[Set[str], Tuple[str, timedelta, int]] -- set of full URL links found on parsed page retrieved via provided <url>
-        and response statistics for visited <url>
+    def _grow(self) -> None:
+        old_table = self._table
+        size = 2 * len(old_table)
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        for fingerprint in old_table:
+            if fingerprint:
+                self._table[self._slot(fingerprint)] = fingerprint
+
+    def __contains__(self, url: object) -> bool:
+        fingerprint = self.fingerprint(str(url))
+        return self._table[self._slot(fingerprint)] == fingerprint
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, url: str) -> None:
+        """Adds <url> to the set.
+
+        Arguments:
+            url {str} -- canonical URL
+        """
+        fingerprint = self.fingerprint(url)
+        index = self._slot(fingerprint)
+        if self._table[index] == 0:
+            self._table[index] = fingerprint
+            self._len += 1
+            if self._len > len(self._table) * self.MAX_LOAD:
+                self._grow()
+
+    def update(self, urls: Iterable[str]) -> None:
+        """Adds all <urls> to the set.
+
+        Arguments:
+            urls {Iterable[str]} -- canonical URLs
+        """
+        for url in urls:
+            self.add(url)
+
+    def to_bytes(self) -> bytes:
+        """Returns the hash table of fingerprints, for checkpoint.
+
+        Returns:
+            bytes -- table restorable by from_bytes()
+        """
+        return self._table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FingerprintSet":
+        """Returns set with the hash table of fingerprints returned by to_bytes().
+
+        Arguments:
+            data {bytes} -- hash table of fingerprints
+
+        Returns:
+            FingerprintSet -- set of URLs
+        """
+        fingerprints = cls()
+        fingerprints._table = array("Q")
+        fingerprints._table.frombytes(data)
+        fingerprints._mask = len(fingerprints._table) - 1
+        fingerprints._len = len(fingerprints._table) - fingerprints._table.count(0)
+        return fingerprints
+
+
+class BloomFilter:
+    """Bloom filter of URLs.
+
+    Answers, whether URL was possibly added (with false positive rate <error> up to <capacity> URLs)
+    or surely not added, by looking up k bits computed by double hashing of blake2b digest.
     """
-    links = get_internal_links(cook_soup(url, session))
-    full_links = {create_full_link(get_hostname(), link) for link in links[0]}
-    full_links_ = {link for link in full_links if link is not None}
-    return (full_links_, links[1])
 
+    def __init__(self, capacity: int = 1_000_000, error: float = 0.001) -> None:
+        """
+        Keyword Arguments:
+            capacity {int} -- expected number of URLs (default: {1_000_000})
+            error {float} -- false positive rate at <capacity> URLs (default: {0.001})
+        """
+        capacity = max(capacity, 1)
+        error = min(max(error, 1e-12), 0.5)
+        self.size = max(int(-capacity * math.log(error) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self.stats: Counter = Counter()
 
-def pool(
-    links_to_visit: Tuple[Set[str], Tuple[str, timedelta, int]],
-    session: r.Session,
-    visited: Set[str],
-    stats: Set[Tuple[str, timedelta, int]],
-) -> Tuple[
-    Tuple[Set[str], Tuple[str, timedelta, int]],
-    Set[str],
-    Set[Tuple[str, timedelta, int]],
-]:
-    """Runs process_page() func as worker using multiprocessing module for all links.
-    Returns new links to scan, visited links and request stats for visited links.
+    def _positions(self, url: str) -> List[int]:
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
 
-    Args:
-        links_to_visit (Tuple[Set[str], Tuple[str, timedelta, int]]): URL links to scan and request stat for URL
-        session (r.Session): session object
-        visited (Set[str]): set of visited links
-        stats (Set[Tuple[str, timedelta, int]]): set of links response stats
+    def __contains__(self, url: object) -> bool:
+        bits = self._bits
+        for position in self._positions(str(url)):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
 
-    Returns:
-        Tuple[ Tuple[Set[str], Tuple[str, timedelta, int]], Set[str], Set[Tuple[str, timedelta, int]], ]: 
-        ((set of links to visit, url's response stats), set of visited urls, set of tuple with visited url, response time, response status code)
+    def add(self, url: str) -> None:
+        """Adds <url> to the filter.
+
+        Arguments:
+            url {str} -- canonical URL
+        """
+        bits = self._bits
+        for position in self._positions(url):
+            bits[position >> 3] |= 1 << (position & 7)
+
+
+class BloomFrontedSet:
+    """Set of visited links with Bloom filter in front of it.
+
+    Links surely not in the filter are new without looking into the exact set,
+    which is useful when the lookup in the exact set is expensive. Outcomes of the checks
+    are counted in stats of the filter, including the measured false positive rate.
     """
-    args = [(link, session) for link in links_to_visit[0]]
 
-    with get_context("spawn").Pool(maxtasksperchild=1) as p:
-        list_links_to_visit = p.starmap(process_page, args)
+    def __init__(
+        self, visited: Union[Set[str], FingerprintSet, "DiskVisitedSet"], bloom: BloomFilter
+    ) -> None:
+        """
+        Arguments:
+            visited {Union[Set[str], FingerprintSet, DiskVisitedSet]} -- exact set of visited links
+            bloom {BloomFilter} -- Bloom filter of the visited links
+        """
+        self.visited = visited
+        self.bloom = bloom
 
-    final_set: Set[str] = list_links_to_visit[0][0]
+    def __contains__(self, url: object) -> bool:
+        stats = self.bloom.stats
+        stats["checks"] += 1
+        if url not in self.bloom:
+            return False
+        stats["possibly_visited"] += 1
+        if url in self.visited:
+            return True
+        stats["false_positives"] += 1
+        return False
 
-    # add all visited links to set
-    for item in list_links_to_visit:
-        visited.add(item[1][0])
-        stats.add(item[1])
-        final_set = item[0].difference(final_set) | final_set
+    def __len__(self) -> int:
+        return len(self.visited)
 
-    final_set = {link for link in final_set if link not in visited}
-    links_to_visit = (final_set, list_links_to_visit[0][1])
+    def add(self, url: str) -> None:
+        """Adds <url> to the set.
 
-    return (links_to_visit, visited, stats)
+        Arguments:
+            url {str} -- canonical URL
+        """
+        self.bloom.add(url)
+        self.visited.add(url)
 
+    def update(self, urls: Iterable[str]) -> None:
+        """Adds all <urls> to the set.
 
-# pylint: disable=dangerous-default-value
-def looper_with_pool(
-    session: r.Session,
-    visited: Union[Set[Any], Set[str]] = set(),
-    links_to_visit: Union[None, Tuple[Set[str], Tuple[str, timedelta, int]]] = None,
-) -> Set[Tuple[str, timedelta, int]]:
-    """Loops pool() funs until there is no unvisited link left.
-    Returns set with tuples of visited links, their response time and response code.
+        Arguments:
+            urls {Iterable[str]} -- canonical URLs
+        """
+        for url in urls:
+            self.add(url)
 
-    Args:
-        session (r.Session): session object
-        visited (Union[Set[Any], Set[str]], optional): set of visited links. Defaults to set().
-        links_to_visit (Union[None, Tuple[Set[str], Tuple[str, timedelta, int]]], optional): links to be scanned. Defaults to None.
 
-    Returns:
-        Set[Tuple[str, timedelta, int]]: set with tuples of visited links, their response time and response code
+class CrawlStore:
+    """SQLite database in WAL mode holding the frontier and visited links on disk.
+
+    Writes are committed in batches of <commit_every>, reads see uncommitted writes
+    of the same connection. Must be used from one thread only.
+
+    Links to visit of the checkpoint are copied into frontier queue CHECKPOINT_QUEUE.
     """
-    links_to_visit = process_page(get_hostname(), session)
-    visited = {links_to_visit[1][0]}
-    stats = set()
 
-    while True:
-        print(f"Found new links to scan: {len(links_to_visit[0])}")
-        if len(list(links_to_visit)[0]) > 0:
-            links_to_visit, visited, stats = pool(
-                links_to_visit, session, visited, stats
-            )
-        else:
-            break
+    CHECKPOINT_QUEUE = 0
 
-    return stats
+    def __init__(self, path: str, commit_every: int = 1000) -> None:
+        """
+        Arguments:
+            path {str} -- path to the database file
 
+        Keyword Arguments:
+            commit_every {int} -- number of writes per commit, 0 commits only
+            by commit(), e.g. with checkpoints (default: {1000})
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self._writes = 0
+        self._next_queue = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS frontier "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, queue INTEGER NOT NULL, url TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_queue ON frontier (queue, id)"
+        )
 
-def save_urls(visited: Set[Tuple[str, timedelta, int]]) -> None:
-    """Saves found URLs stats into .csv file.
+    def clear(self) -> None:
+        """Removes all links from the database."""
+        self.connection.execute("DELETE FROM visited")
+        self.connection.execute("DELETE FROM frontier")
+        self.commit()
 
-    Arguments:
-        visited {Set[Tuple[str, timedelta, int]]} -- set of all found URLs response stats on the site
+    def new_queue(self) -> int:
+        """Returns id of new frontier queue.
+
+        Returns:
+            int -- queue id
+        """
+        self._next_queue += 1
+        return self._next_queue
+
+    def wrote(self, count: int = 1) -> None:
+        """Counts <count> writes and commits, if there is <commit_every> of them.
+
+        Keyword Arguments:
+            count {int} -- number of writes (default: {1})
+        """
+        self._writes += count
+        if self.commit_every and self._writes >= self.commit_every:
+            self.commit()
+
+    def save_frontier(self, urls: Iterable[str]) -> None:
+        """Replaces links to visit of the checkpoint by <urls> and commits all writes.
+
+        Arguments:
+            urls {Iterable[str]} -- links to visit
+        """
+        connection = self.connection
+        connection.execute("DELETE FROM frontier WHERE queue = ?", (self.CHECKPOINT_QUEUE,))
+        connection.executemany(
+            "INSERT INTO frontier (queue, url) VALUES (?, ?)",
+            ((self.CHECKPOINT_QUEUE, url) for url in urls),
+        )
+        # links may repeat, when the crawl is interrupted while moving them
+        connection.execute(
+            "DELETE FROM frontier WHERE queue = ? AND id NOT IN "
+            "(SELECT MIN(id) FROM frontier WHERE queue = ? GROUP BY url)",
+            (self.CHECKPOINT_QUEUE, self.CHECKPOINT_QUEUE),
+        )
+        self.commit()
+
+    def commit(self) -> None:
+        """Commits all writes."""
+        self.connection.commit()
+        self._writes = 0
+
+    def close(self) -> None:
+        """Commits all writes and closes the database."""
+        self.commit()
+        self.connection.close()
+
+
+class DiskVisitedSet:
+    """Set of visited links stored in CrawlStore.
+
+    Recently added or found links are kept in LRU hot cache of <cache_size> links,
+    the others are looked up in the database.
     """
-    filename = "scanned_links.csv"
-    timestamp = dt.now().strftime("%Y%m%d_%H%M%S")
-    filepath = "_".join([timestamp, filename])
 
-    with open(filepath, mode="w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["scanned_links", "response_time", "response_status_code"])
-        for link in visited:
-            writer.writerow(link)
+    def __init__(self, store: CrawlStore, cache_size: int = 100_000) -> None:
+        """
+        Arguments:
+            store {CrawlStore} -- database of the crawl
 
-    print(f"Scanned urls saved to: '{filepath}'")
+        Keyword Arguments:
+            cache_size {int} -- number of links kept in memory (default: {100_000})
+        """
+        self.store = store
+        self.cache_size = max(cache_size, 1)
+        self._cache: "OrderedDict[str, None]" = OrderedDict()
+        self._size = store.connection.execute("SELECT COUNT(*) FROM visited").fetchone()[0]
 
+    def _remember(self, url: str) -> None:
+        self._cache[url] = None
+        self._cache.move_to_end(url)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
-def pretty_print(visited: Set[Tuple[str, timedelta, int]]) -> None:
-    """PrettyPrints all found URLs on the site and total count of them.
+    def __contains__(self, url: object) -> bool:
+        if url in self._cache:
+            self._cache.move_to_end(url)  # type: ignore
+            return True
+        row = self.store.connection.execute(
+            "SELECT 1 FROM visited WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return False
+        self._remember(str(url))
+        return True
 
-    Arguments:
-        visited {Set[Tuple[str, timedelta, int]]} -- set of all found URLs on the site
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, url: str) -> None:
+        """Adds <url> to the set.
+
+        Arguments:
+            url {str} -- canonical URL
+        """
+        if url in self._cache:
+            return
+        cursor = self.store.connection.execute(
+            "INSERT OR IGNORE INTO visited (url) VALUES (?)", (url,)
+        )
+        self._size += cursor.rowcount
+        self.store.wrote()
+        self._remember(url)
+
+    def __iter__(self) -> Iterator[str]:
+        for (url,) in self.store.connection.execute("SELECT url FROM visited"):
+            yield url
+
+    def update(self, urls: Iterable[str]) -> None:
+        """Adds all <urls> to the set.
+
+        Arguments:
+            urls {Iterable[str]} -- canonical URLs
+        """
+        for url in urls:
+            self.add(url)
+
+
+class DiskFrontier:
+    """FIFO queue of links to visit stored in CrawlStore.
+
+    Up to <cache_size> links at the head of the queue are kept in memory,
+    the rest waits in the database and is loaded in batches, when the head runs out.
     """
-    printer = PrettyPrinter(indent=2)
-    printer.pprint({"URLs scanned": [items[0] for items in visited]})
-    print(f"No. of URLs scanned: {len(visited)}")
+
+    def __init__(self, store: CrawlStore, cache_size: int = 100_000) -> None:
+        """
+        Arguments:
+            store {CrawlStore} -- database of the crawl
+
+        Keyword Arguments:
+            cache_size {int} -- number of links kept in memory (default: {100_000})
+        """
+        self.store = store
+        self.cache_size = max(cache_size, 1)
+        self.queue = store.new_queue()
+        self._head: deque = deque()
+        self._stored = 0
+
+    def __len__(self) -> int:
+        return len(self._head) + self._stored
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def append(self, url: str) -> None:
+        """Adds <url> to the end of the queue.
+
+        Arguments:
+            url {str} -- link to visit
+        """
+        if self._stored == 0 and len(self._head) < self.cache_size:
+            self._head.append(url)
+            return
+        self.store.connection.execute(
+            "INSERT INTO frontier (queue, url) VALUES (?, ?)", (self.queue, url)
+        )
+        self._stored += 1
+        self.store.wrote()
+
+    def extend(self, urls: Iterable[str]) -> None:
+        """Adds all <urls> to the end of the queue.
+
+        Arguments:
+            urls {Iterable[str]} -- links to visit
+        """
+        for url in urls:
+            self.append(url)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self._head)
+        for (url,) in self.store.connection.execute(
+            "SELECT url FROM frontier WHERE queue = ? ORDER BY id", (self.queue,)
+        ):
+            yield url
+
+    def resume(self) -> None:
+        """Takes over links to visit of the checkpoint saved by CrawlStore.save_frontier(),
+        links of the queues of the interrupted crawl are removed.
+        """
+        connection = self.store.connection
+        checkpoint_queue = self.store.CHECKPOINT_QUEUE
+        connection.execute(
+            "DELETE FROM frontier WHERE queue NOT IN (?, ?)", (checkpoint_queue, self.queue)
+        )
+        cursor = connection.execute(
+            "UPDATE frontier SET queue = ? WHERE queue = ?", (self.queue, checkpoint_queue)
+        )
+        self._stored += cursor.rowcount
+        self.store.wrote(cursor.rowcount)
+
+    def popleft(self) -> str:
+        """Removes and returns link from the head of the queue.
+
+        Returns:
+            str -- link to visit
+        """
+        if not self._head and self._stored:
+            self._load()
+        return self._head.popleft()
+
+    def _load(self) -> None:
+        connection = self.store.connection
+        rows = connection.execute(
+            "SELECT id, url FROM frontier WHERE queue = ? ORDER BY id LIMIT ?",
+            (self.queue, self.cache_size),
+        ).fetchall()
+        connection.execute(
+            "DELETE FROM frontier WHERE queue = ? AND id <= ?", (self.queue, rows[-1][0])
+        )
+        self._stored -= len(rows)
+        self._head.extend(url for _, url in rows)
+        self.store.wrote(len(rows))
+
+
+class PageIndex:
+    """Validators (ETag, Last-Modified) and outgoing links of crawled pages in SQLite database,
+    for incremental recrawl.
+
+    Validators of the previous crawl are sent in conditional GET request, page not modified
+    since then (304) is not downloaded and its stored links are used instead. Every process
+    and thread opens its own connection; validators of the fetched page are held until
+    its links are saved with them by save().
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Arguments:
+            path {str} -- path to the database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages "
+            "(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT NOT NULL)"
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # writes of all workers are serialized by database lock
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Returns headers of conditional GET request of <url> with validators of the previous crawl.
+
+        Arguments:
+            url {str} -- canonical URL
+
+        Returns:
+            Dict[str, str] -- If-None-Match and If-Modified-Since headers, empty for new page
+        """
+        row = self._connection().execute(
+            "SELECT etag, last_modified FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def links(self, url: str) -> List[str]:
+        """Returns links of <url> saved by the previous crawl.
+
+        Arguments:
+            url {str} -- canonical URL
+
+        Returns:
+            List[str] -- full links found on the page
+        """
+        row = self._connection().execute(
+            "SELECT links FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        return row[0].split("\n") if row is not None and row[0] else []
+
+    def observe(self, url: str, headers: Any) -> None:
+        """Holds validators from response <headers> of <url>, until its links are saved.
+
+        Arguments:
+            url {str} -- canonical URL
+            headers {Any} -- case-insensitive mapping of response headers
+        """
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if etag or last_modified:
+            self._validators[url] = (etag, last_modified)
+
+    def pop_validators(self, url: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Returns and forgets validators held for <url>.
+
+        Arguments:
+            url {str} -- canonical URL
+
+        Returns:
+            Optional[Tuple[Optional[str], Optional[str]]] -- ETag and Last-Modified, None if there are none
+        """
+        return self._validators.pop(url, None)
+
+    def save(
+        self,
+        url: str,
+        links: Iterable[str],
+        validators: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> None:
+        """Saves <links> of <url> with its validators, pages without validators are not saved.
+
+        Arguments:
+            url {str} -- canonical URL
+            links {Iterable[str]} -- full links found on the page
+
+        Keyword Arguments:
+            validators {Optional[Tuple[Optional[str], Optional[str]]]} -- ETag and Last-Modified,
+            defaults to the validators held for <url> (default: {None})
+        """
+        validators = validators or self.pop_validators(url)
+        if validators is None:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, links) VALUES (?, ?, ?, ?)",
+                (url, validators[0], validators[1], "\n".join(sorted(links))),
+            )
+
+
+class ResponseCache:
+    """Local on-disk cache of responses keyed by canonical URL.
+
+    Bodies are compressed and stored once per content (named by SHA-256 of the body)
+    in <directory>/objects, response status, headers and response time are stored in SQLite
+    index, which is shared by all processes. Entries older than <ttl> seconds are not used;
+    least recently used entries are evicted, when the bodies take more than <max_size> bytes.
+    """
+
+    EVICT_EVERY = 100
+
+    def __init__(self, directory: str, max_size: int, ttl: float) -> None:
+        """
+        Arguments:
+            directory {str} -- cache directory
+            max_size {int} -- max. size of compressed bodies in bytes
+            ttl {float} -- seconds, for which the entry is used
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self._puts = 0
+        self._local = threading.local()
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, "
+            "status INTEGER NOT NULL, headers TEXT NOT NULL, elapsed REAL NOT NULL, "
+            "digest TEXT, size INTEGER NOT NULL, stored REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def get(self, url: str) -> Optional[r.Response]:
+        """Returns cached response of <url> with the body already read,
+        None if it is not cached or it is expired.
+
+        Arguments:
+            url {str} -- canonical URL
+
+        Returns:
+            Optional[r.Response] -- cached response
+        """
+        connection = self._connection()
+        try:
+            row = connection.execute(
+                "SELECT status, headers, elapsed, digest, stored FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None or time() - row[4] > self.ttl:
+                return None
+            headers = CaseInsensitiveDict(json.loads(row[1]))
+        except (sqlite3.Error, ValueError, TypeError):
+            # broken index is a miss, the page is downloaded and cached again
+            return None
+
+        body = b""
+        if row[3] is not None:
+            try:
+                with open(self._body_path(row[3]), mode="rb") as f:
+                    body = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                # evicted by other process meanwhile
+                return None
+
+        try:
+            with connection:
+                connection.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time(), url))
+        except sqlite3.Error:
+            # only the eviction order is lost
+            pass
+
+        response = r.Response()
+        response.url = url
+        response.status_code = row[0]
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.elapsed = timedelta(seconds=row[2])
+        # pylint: disable=protected-access
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def put(
+        self,
+        url: str,
+        status_code: int,
+        headers: Any,
+        elapsed: timedelta,
+        body: Optional[bytes] = None,
+    ) -> None:
+        """Stores response of <url> into the cache.
+
+        Arguments:
+            url {str} -- canonical URL
+            status_code {int} -- response status code
+            headers {Any} -- mapping of response headers
+            elapsed {timedelta} -- response time
+
+        Keyword Arguments:
+            body {Optional[bytes]} -- response body, None for response without read body (default: {None})
+        """
+        digest = None
+        size = 0
+        if body is not None:
+            digest = hashlib.sha256(body).hexdigest()
+            path = self._body_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temporary, mode="wb") as f:
+                    f.write(zlib.compress(body))
+                os.replace(temporary, path)
+            size = os.path.getsize(path)
+
+        now = time()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, status, headers, elapsed, digest, size, stored, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    status_code,
+                    json.dumps(dict(headers)),
+                    elapsed.total_seconds(),
+                    digest,
+                    size,
+                    now,
+                    now,
+                ),
+            )
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        """Removes expired entries and least recently used entries over <max_size>
+        and bodies no entry refers to.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM responses WHERE stored < ?", (time() - self.ttl,))
+            total = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM "
+                "(SELECT DISTINCT digest, size FROM responses WHERE digest IS NOT NULL)"
+            ).fetchone()[0]
+            if total > self.max_size:
+                evicted = 0
+                for url, size in connection.execute(
+                    "SELECT url, size FROM responses ORDER BY accessed"
+                ).fetchall():
+                    if total - evicted <= self.max_size:
+                        break
+                    connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+                    evicted += size
+            referenced = {
+                digest
+                for (digest,) in connection.execute(
+                    "SELECT DISTINCT digest FROM responses WHERE digest IS NOT NULL"
+                )
+            }
+
+        objects = os.path.join(self.directory, "objects")
+        for prefix in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, prefix)):
+                if name not in referenced and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(objects, prefix, name))
+                    except OSError:
+                        pass
+
+
+VisitedSet = Union[Set[str], FingerprintSet, DiskVisitedSet, BloomFrontedSet]
+Frontier = Union[deque, DiskFrontier]
+
+
+class PublicSuffixList:
+    """Public suffix list stored in a trie of reversed labels.
+
+    Used to find registrable domain of a host, e.g. 'ihned.cz' for 'www.ihned.cz'
+    or 'example.co.uk' for 'www.example.co.uk'.
+
+    See:
+        https://publicsuffix.org/list/
+    """
+
+    def __init__(self, rules: Iterable[str]) -> None:
+        """
+        Arguments:
+            rules {Iterable[str]} -- rules of the list, e.g. 'co.uk', '*.ck', '!www.ck'
+        """
+        self._root: Dict[Any, Any] = {}
+        for rule in rules:
+            exception = rule.startswith("!")
+            node = self._root
+            for label in reversed(rule.lstrip("!").split(".")):
+                node = node.setdefault(label, {})
+            # None key marks end of the rule, True for exception rule
+            node[None] = exception
+
+    @classmethod
+    def load(cls, path: str = PUBLIC_SUFFIX_LIST) -> "PublicSuffixList":
+        """Returns public suffix list loaded from the file in publicsuffix.org format.
+
+        Keyword Arguments:
+            path {str} -- path of the file (default: {PUBLIC_SUFFIX_LIST})
+
+        Returns:
+            PublicSuffixList -- loaded list
+        """
+        rules = []
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if (not line) or line.startswith("//"):
+                    continue
+                rule = line.split()[0].lower()
+                rules.append(rule)
+                try:
+                    # hosts in URLs are usually punycoded
+                    ascii_rule = rule.encode("idna").decode("ascii")
+                except UnicodeError:
+                    continue
+                if ascii_rule != rule:
+                    rules.append(ascii_rule)
+        return cls(rules)
+
+    def registrable_domain(self, host: str) -> Optional[str]:
+        """Returns registrable domain of <host> - its public suffix and one more label.
+
+        Arguments:
+            host {str} -- lowercase host name
+
+        Returns:
+            Optional[str] -- registrable domain, None if <host> is a public suffix itself
+        """
+        labels = host.split(".")[::-1]
+        if "" in labels:
+            return None
+
+        node = self._root
+        # unlisted TLD is a public suffix by the implicit '*' rule
+        length = 1
+        for depth, label in enumerate(labels):
+            child = node.get(label)
+            if (child is not None) and child.get(None) is True:
+                length = depth
+                break
+            wildcard = node.get("*")
+            if (wildcard is not None) and (None in wildcard):
+                length = max(length, depth + 1)
+            if child is None:
+                break
+            if None in child:
+                length = max(length, depth + 1)
+            node = child
+
+        if len(labels) <= length:
+            return None
+        return ".".join(reversed(labels[: length + 1]))
+
+
+_public_suffix_list: Optional[PublicSuffixList] = None
+
+
+def get_public_suffix_list() -> PublicSuffixList:
+    """Returns bundled public suffix list. The list is loaded only once.
+
+    Returns:
+        PublicSuffixList -- public suffix list
+    """
+    global _public_suffix_list  # pylint: disable=global-statement
+    if _public_suffix_list is None:
+        _public_suffix_list = PublicSuffixList.load()
+    return _public_suffix_list
+
+
+class HostScope:
+    """Matcher of hosts considered internal, stored in a trie of reversed labels.
+
+    Host is matched by walking its labels from the TLD, so the check takes
+    the same time regardless of the number of allowed hosts.
+    """
+
+    def __init__(self) -> None:
+        self._root: Dict[Any, Any] = {}
+
+    def add(self, host: str, subdomains: bool = False) -> None:
+        """Adds <host> to the scope.
+
+        Arguments:
+            host {str} -- host name
+
+        Keyword Arguments:
+            subdomains {bool} -- include also all subdomains of <host> (default: {False})
+        """
+        node = self._root
+        for label in reversed(host.lower().split(".")):
+            node = node.setdefault(label, {})
+        # None key marks allowed host, True if its subdomains are allowed too
+        node[None] = node.get(None, False) or subdomains
+
+    def matches(self, host: str) -> bool:
+        """Returns True, if <host> is in the scope.
+
+        Arguments:
+            host {str} -- lowercase host name
+
+        Returns:
+            bool -- True for internal host
+        """
+        node = self._root
+        labels = host.split(".")
+        for index in range(len(labels) - 1, -1, -1):
+            node = node.get(labels[index])
+            if node is None:
+                return False
+            if node.get(None) is True:
+                return True
+        return None in node
+
+
+def build_host_scope(hostname: str, mode: str, allowed_hosts: Sequence[str] = ()) -> HostScope:
+    """Returns scope of internal hosts of the crawl starting at <hostname>.
+
+    Arguments:
+        hostname {str} -- URL hostname to start the crawl from
+        mode {str} -- 'exact', 'domain' or 'allowlist'
+
+    Keyword Arguments:
+        allowed_hosts {Sequence[str]} -- additional internal hosts, '*.' prefix includes subdomains (default: {()})
+
+    Returns:
+        HostScope -- scope of internal hosts
+    """
+    scope = HostScope()
+    host = urlsplit(hostname).hostname or ""
+
+    registrable_domain = None
+    if mode == "domain":
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            registrable_domain = get_public_suffix_list().registrable_domain(host)
+
+    if registrable_domain is not None:
+        scope.add(registrable_domain, subdomains=True)
+    else:
+        scope.add(host)
+
+    for allowed_host in allowed_hosts:
+        if allowed_host.startswith("*."):
+            scope.add(allowed_host[2:], subdomains=True)
+        else:
+            scope.add(allowed_host)
+    return scope
+
+
+class CrawlContext:
+    """Crawl configuration computed once at startup and passed to all workers.
+
+    Holds canonical seed URL, precompiled css selector of internal links, scope of internal hosts
+    and options of the crawl, so the workers do not compute them for every page
+    and the crawler can be used without sys.argv.
+    """
+
+    def __init__(self, hostname: str, options: Optional[argparse.Namespace] = None) -> None:
+        """
+        Arguments:
+            hostname {str} -- URL hostname to start the crawl from, e.g. https://www.ihned.cz
+
+        Keyword Arguments:
+            options {Optional[argparse.Namespace]} -- options of the crawl as returned by parse_arguments(),
+            defaults to default values of all options (default: {None})
+        """
+        self.hostname = hostname
+        self.options = options if options is not None else parse_arguments([hostname])
+        self.scope = build_host_scope(hostname, self.options.scope, self.options.allow_host)
+        # links to other hosts can be internal only with wider scope than the exact host
+        if (self.options.scope == "exact") and (not self.options.allow_host):
+            self.href_prefixes: Tuple[str, ...] = (hostname, "/")
+        else:
+            self.href_prefixes = ("http://", "https://", "/")
+        self.selector = soupsieve.compile(
+            ", ".join(f'a[href^="{prefix}"]' for prefix in self.href_prefixes)
+        )
+        self.query_policy = QueryPolicy(
+            self.options.query,
+            self.options.allow_param,
+            DEFAULT_DENIED_PARAMS + tuple(self.options.deny_param),
+        )
+        seed_url = self.canonicalize(hostname)
+        if seed_url is None:
+            raise ValueError(f"Invalid URL to start the crawl from: '{hostname}'")
+        self.seed_url = seed_url
+
+    def canonicalize(self, url: str) -> Optional[str]:
+        """Returns canonical form of <url> by canonicalize_url() with options of the crawl,
+        or None, if <url> is malformed.
+
+        Arguments:
+            url {str} -- full URL link
+
+        Returns:
+            Optional[str] -- canonical URL
+        """
+        return canonicalize_url(url, self.options.trailing_slash, self.query_policy)
+
+    def is_internal_host(self, host: Optional[str]) -> bool:
+        """Returns True, if <host> is in the scope of the crawl,
+        e.g. 'archiv.ihned.cz' for 'www.ihned.cz' with 'domain' scope.
+
+        Arguments:
+            host {Optional[str]} -- lowercase host of the link
+
+        Returns:
+            bool -- True for internal host
+        """
+        return (host is not None) and self.scope.matches(host)
+
+
+_crawl_context: Optional[CrawlContext] = None
+
+
+def set_crawl_context(context: CrawlContext) -> None:
+    """Sets crawl context of the current process.
+
+    Used also as initializer of worker processes.
+
+    Arguments:
+        context {CrawlContext} -- crawl context
+    """
+    global _crawl_context  # pylint: disable=global-statement
+    _crawl_context = context
+
+
+def get_crawl_context() -> CrawlContext:
+    """Returns crawl context of the current process.
+
+    If no context was set, new one is created from command line arguments.
+
+    Returns:
+        CrawlContext -- crawl context
+    """
+    if _crawl_context is None:
+        arguments = get_arguments()
+        set_crawl_context(CrawlContext(arguments.hostname, arguments))
+    # pyre-ignore
+    return _crawl_context
+
+
+def start_session() -> r.Session:
+    """Returns requests module Session object
+
+    Returns:
+        {r.Session} -- requests.Session() object
+    """
+    return r.Session()
+
+
+def close_session(session: r.Session) -> None:
+    """Closes requests.Session() session.
+
+    Arguments:
+        session {r.Session()} -- requests.Session() object
+    """
+    session.close()
+
+
+class HostRateLimiter:
+    """Per-host token bucket rate limiter.
+
+    Every host (URL netloc) has its own bucket holding up to <burst> tokens,
+    which is refilled by <rate> tokens per second. One instance is shared by all workers
+    of the crawl - either directly, or via CrawlManager proxy across the processes.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        Arguments:
+            rate {float} -- max. number of requests per second to one host, 0 disables the limit
+            burst {int} -- max. number of requests to one host sent at once
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+        self._deferred: Dict[str, float] = {}
+
+    def reserve(self, url: str) -> float:
+        """Reserves one request to the host of <url>.
+        Returns number of seconds the caller has to wait before sending it.
+
+        Arguments:
+            url {str} -- URL to be requested
+
+        Returns:
+            float -- seconds to wait
+        """
+        netloc = urlsplit(url).netloc.lower()
+        wait = 0.0
+
+        with self._lock:
+            now = monotonic()
+            if self.rate > 0:
+                tokens, updated = self._buckets.get(netloc, (float(self.burst), now))
+                tokens = min(float(self.burst), tokens + (now - updated) * self.rate) - 1
+                self._buckets[netloc] = (tokens, now)
+                # negative amount of tokens is the debt of already reserved requests
+                if tokens < 0:
+                    wait = -tokens / self.rate
+            deferred = self._deferred.get(netloc, now)
+
+        return max(wait, deferred - now)
+
+    def defer(self, url: str, seconds: float) -> None:
+        """Defers all requests to the host of <url> by <seconds>, e.g. because of Retry-After header.
+
+        Arguments:
+            url {str} -- URL of the host
+            seconds {float} -- number of seconds to defer the requests by
+        """
+        netloc = urlsplit(url).netloc.lower()
+        with self._lock:
+            until = monotonic() + seconds
+            self._deferred[netloc] = max(self._deferred.get(netloc, until), until)
+
+
+class ConcurrencyController:
+    """AIMD (additive increase, multiplicative decrease) controller of the number of in-flight requests.
+
+    The limit grows by one per window of healthy responses and is halved on 429/503 responses
+    or when the response time exceeds <latency_factor> times the healthy baseline.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int, latency_factor: float = 3.0
+    ) -> None:
+        """
+        Arguments:
+            initial {int} -- initial number of in-flight requests
+            minimum {int} -- min. number of in-flight requests
+            maximum {int} -- max. number of in-flight requests
+
+        Keyword Arguments:
+            latency_factor {float} -- response time rise considered to be a congestion (default: {3.0})
+        """
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.latency_factor = latency_factor
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, status_code: int) -> None:
+        """Adjusts the limit by response statistics of one request.
+
+        Arguments:
+            elapsed {float} -- response time in seconds
+            status_code {int} -- response status code
+        """
+        with self._lock:
+            baseline = self._baseline
+            slow = (
+                baseline is not None
+                and elapsed > 1.0
+                and elapsed > baseline * self.latency_factor
+            )
+            if (status_code in BACKOFF_STATUS_CODES) or slow:
+                # back off at most once per response time, the responses in flight
+                # were sent with the same limit
+                now = monotonic()
+                if now - self._last_decrease >= max(baseline or 0.0, 1.0):
+                    self._limit = max(float(self.minimum), self._limit / 2)
+                    self._last_decrease = now
+            else:
+                self._limit = min(float(self.maximum), self._limit + 1 / self._limit)
+                self._baseline = (
+                    elapsed if baseline is None else 0.9 * baseline + 0.1 * elapsed
+                )
+
+    def get_limit(self) -> int:
+        """Returns current max. number of in-flight requests.
+
+        Returns:
+            int -- number of in-flight requests
+        """
+        return int(self._limit)
+
+
+class AdaptiveSemaphore:
+    """asyncio semaphore, which number of slots follows the limit of ConcurrencyController."""
+
+    def __init__(self, controller: ConcurrencyController) -> None:
+        """
+        Arguments:
+            controller {ConcurrencyController} -- controller of the number of in-flight requests
+        """
+        self.controller = controller
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self._in_flight < self.controller.get_limit()
+            )
+            self._in_flight += 1
+
+    async def __aexit__(self, *args: Any) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    After <failures> consecutive failed fetches (connection errors, timeouts, 5xx responses)
+    of a host its requests are short-circuited for <cooldown> seconds. The next failure
+    after the cool-down opens the circuit again, any success closes it.
+    """
+
+    def __init__(self, failures: int = 5, cooldown: float = 60.0) -> None:
+        """
+        Keyword Arguments:
+            failures {int} -- consecutive failures opening the circuit, 0 disables it (default: {5})
+            cooldown {float} -- seconds, for which the circuit stays open (default: {60.0})
+        """
+        self.failures = failures
+        self.cooldown = cooldown
+        self._failed: Counter = Counter()
+        self._open_until: Dict[str, float] = {}
+        # manager serves every proxy connection by its own thread
+        self._lock = threading.Lock()
+
+    def allow(self, url: str) -> bool:
+        """Returns True, if request to the host of <url> can be sent.
+
+        Arguments:
+            url {str} -- requested url
+
+        Returns:
+            bool -- False, if the circuit of the host is open
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            return monotonic() >= self._open_until.get(host, 0.0)
+
+    def record(self, url: str, success: bool) -> None:
+        """Records outcome of the fetch of <url>.
+
+        Arguments:
+            url {str} -- requested url
+            success {bool} -- False for connection error, timeout or 5xx response
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if success:
+                self._failed.pop(host, None)
+                return
+            self._failed[host] += 1
+            failed = self._failed[host]
+            opened = bool(self.failures) and failed >= self.failures
+            if opened:
+                self._open_until[host] = monotonic() + self.cooldown
+        if opened:
+            print(
+                f"Circuit breaker: {failed} consecutive failures of '{host}', "
+                f"requests are short-circuited for {self.cooldown:g} s"
+            )
+
+
+class MissingContentTypeError(Exception):
+    """Response has no content-type header."""
+
+
+class CircuitOpenError(Exception):
+    """Request was not sent, because the circuit of the host is open."""
+
+
+class CrawlShutdownError(Exception):
+    """Page was not requested, because the crawl is shutting down."""
+
+
+class PageTimeoutError(r.exceptions.Timeout):
+    """Page was not downloaded in --page-timeout, retried as the other timeouts."""
+
+
+class CrawlManager(BaseManager):
+    """Manager process holding objects shared by all worker processes."""
+
+
+CrawlManager.register("HostRateLimiter", HostRateLimiter)
+CrawlManager.register("ConcurrencyController", ConcurrencyController)
+CrawlManager.register("CircuitBreaker", CircuitBreaker)
+
+
+def start_manager() -> CrawlManager:
+    """Returns started manager of objects shared by all worker processes.
+
+    Returns:
+        CrawlManager -- started manager object
+    """
+    manager = CrawlManager(ctx=get_context("spawn"))
+    manager.start(ignore_sigint)  # pylint: disable=consider-using-with
+    return manager
+
+
+_rate_limiter: Any = None
+
+
+def set_rate_limiter(rate_limiter: Any) -> None:
+    """Sets rate limiter used by all fetches of the current process.
+
+    Used also as initializer of worker processes.
+
+    Arguments:
+        rate_limiter {Any} -- HostRateLimiter object or its CrawlManager proxy
+    """
+    global _rate_limiter  # pylint: disable=global-statement
+    _rate_limiter = rate_limiter
+
+
+def get_rate_limiter() -> Any:
+    """Returns rate limiter of the current process.
+
+    If no limiter was set, new one is created from --host-rate and --host-burst options.
+
+    Returns:
+        Any -- HostRateLimiter object or its CrawlManager proxy
+    """
+    if _rate_limiter is None:
+        options = get_crawl_context().options
+        set_rate_limiter(HostRateLimiter(options.host_rate, options.host_burst))
+    return _rate_limiter
+
+
+_circuit_breaker: Any = None
+
+
+def set_circuit_breaker(circuit_breaker: Any) -> None:
+    """Sets circuit breaker used by all fetches of the current process.
+
+    Arguments:
+        circuit_breaker {Any} -- CircuitBreaker object or its CrawlManager proxy
+    """
+    global _circuit_breaker  # pylint: disable=global-statement
+    _circuit_breaker = circuit_breaker
+
+
+def get_circuit_breaker() -> Any:
+    """Returns circuit breaker of the current process.
+
+    If no circuit breaker was set, new one is created from --breaker-failures
+    and --breaker-cooldown options.
+
+    Returns:
+        Any -- CircuitBreaker object or its CrawlManager proxy
+    """
+    if _circuit_breaker is None:
+        options = get_crawl_context().options
+        set_circuit_breaker(CircuitBreaker(options.breaker_failures, options.breaker_cooldown))
+    return _circuit_breaker
+
+
+def can_retry(attempts: int) -> bool:
+    """Returns True, if failed fetch can be attempted again after <attempts>.
+
+    Arguments:
+        attempts {int} -- number of attempts made
+
+    Returns:
+        bool -- False after --max-attempts or when the crawl is shutting down
+    """
+    return attempts < get_crawl_context().options.max_attempts and not is_shutting_down()
+
+
+def retry_delay(attempt: int) -> float:
+    """Returns seconds to wait before the next attempt after failed <attempt>,
+    random up to --retry-backoff * 2 ** (attempt - 1), at most --retry-max-backoff (full jitter).
+
+    Arguments:
+        attempt {int} -- number of the failed attempt, starting with 1
+
+    Returns:
+        float -- seconds to wait
+    """
+    options = get_crawl_context().options
+    return random.uniform(
+        0.0, min(options.retry_max_backoff, options.retry_backoff * 2 ** (attempt - 1))
+    )
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """Returns True, if the fetch of page with <status_code> should be retried.
+
+    Arguments:
+        status_code {int} -- response status code
+
+    Returns:
+        bool -- True for status in --retry-status
+    """
+    return status_code in (get_crawl_context().options.retry_status or RETRY_STATUS_CODES)
+
+
+def get_concurrency_limits(maximum: int) -> Tuple[int, int, int]:
+    """Returns initial, min. and max. number of in-flight requests for ConcurrencyController.
+
+    Without --adaptive option all three limits are equal to <maximum>, so the concurrency is fixed.
+    Otherwise the crawl starts at quarter of <maximum>.
+
+    Arguments:
+        maximum {int} -- max. number of in-flight requests
+
+    Returns:
+        Tuple[int, int, int] -- initial, min. and max. number of in-flight requests
+    """
+    options = get_crawl_context().options
+    if not options.adaptive:
+        return (maximum, maximum, maximum)
+    minimum = max(min(options.min_concurrency, maximum), 1)
+    return (max(minimum, maximum // 4), minimum, maximum)
+
+
+_concurrency_controller: Any = None
+
+
+def set_concurrency_controller(concurrency_controller: Any) -> None:
+    """Sets concurrency controller fed by all fetches of the current process.
+
+    Arguments:
+        concurrency_controller {Any} -- ConcurrencyController object or its CrawlManager proxy
+    """
+    global _concurrency_controller  # pylint: disable=global-statement
+    _concurrency_controller = concurrency_controller
+
+
+def get_concurrency_controller() -> Any:
+    """Returns concurrency controller of the current process.
+
+    If no controller was set, new one is created from --concurrency option.
+
+    Returns:
+        Any -- ConcurrencyController object or its CrawlManager proxy
+    """
+    if _concurrency_controller is None:
+        limits = get_concurrency_limits(get_crawl_context().options.concurrency)
+        set_concurrency_controller(ConcurrencyController(*limits))
+    return _concurrency_controller
+
+
+def init_process(
+    rate_limiter: Any,
+    concurrency_controller: Any,
+    context: Optional[CrawlContext] = None,
+    circuit_breaker: Any = None,
+    shutdown_event: Any = None,
+) -> None:
+    """Sets objects shared by all worker processes. Used as initializer of worker processes.
+
+    Arguments:
+        rate_limiter {Any} -- HostRateLimiter object or its CrawlManager proxy
+        concurrency_controller {Any} -- ConcurrencyController object or its CrawlManager proxy
+
+    Keyword Arguments:
+        context {Optional[CrawlContext]} -- crawl context (default: {None})
+        circuit_breaker {Any} -- CircuitBreaker object or its CrawlManager proxy (default: {None})
+        shutdown_event {Any} -- multiprocessing.Event set on shutdown of the crawl (default: {None})
+    """
+    ignore_sigint()
+    if context is not None:
+        set_crawl_context(context)
+    set_rate_limiter(rate_limiter)
+    set_concurrency_controller(concurrency_controller)
+    set_circuit_breaker(circuit_breaker)
+    set_shutdown_event(shutdown_event)
+
+
+_trap_detector: Optional[TrapDetector] = None
+
+
+def set_trap_detector(trap_detector: TrapDetector) -> None:
+    """Sets crawl trap detector of the process scheduling the links.
+
+    Arguments:
+        trap_detector {TrapDetector} -- crawl trap detector
+    """
+    global _trap_detector  # pylint: disable=global-statement
+    _trap_detector = trap_detector
+
+
+def get_trap_detector() -> TrapDetector:
+    """Returns crawl trap detector of the current process.
+
+    If no detector was set, new one is created from --max-* options.
+
+    Returns:
+        TrapDetector -- crawl trap detector
+    """
+    if _trap_detector is None:
+        options = get_crawl_context().options
+        set_trap_detector(
+            TrapDetector(
+                options.max_depth,
+                options.max_segment_repeats,
+                options.max_template_urls,
+                options.max_query_variants,
+            )
+        )
+    # pyre-ignore
+    return _trap_detector
+
+
+_crawl_store: Optional[CrawlStore] = None
+
+
+def set_crawl_store(store: Optional[CrawlStore]) -> None:
+    """Sets database holding the frontier and visited links of the current process.
+
+    Arguments:
+        store {Optional[CrawlStore]} -- database, None keeps them in memory
+    """
+    global _crawl_store  # pylint: disable=global-statement
+    _crawl_store = store
+
+
+def get_crawl_store() -> Optional[CrawlStore]:
+    """Returns database holding the frontier and visited links of the current process.
+
+    Returns:
+        Optional[CrawlStore] -- database, None if they are kept in memory
+    """
+    return _crawl_store
+
+
+_page_index: Optional[PageIndex] = None
+
+
+def get_page_index() -> Optional[PageIndex]:
+    """Returns index of pages of the previous crawls given by --incremental option,
+    opened once per process.
+
+    Returns:
+        Optional[PageIndex] -- page index, None if the crawl is not incremental
+    """
+    global _page_index  # pylint: disable=global-statement
+    path = get_crawl_context().options.incremental
+    if path is None:
+        return None
+    if _page_index is None or _page_index.path != path:
+        _page_index = PageIndex(path)
+    return _page_index
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Returns response cache given by --cache option, opened once per process.
+
+    Returns:
+        Optional[ResponseCache] -- response cache, None if the responses are not cached
+    """
+    global _response_cache  # pylint: disable=global-statement
+    options = get_crawl_context().options
+    if options.cache is None:
+        return None
+    if _response_cache is None or _response_cache.directory != options.cache:
+        _response_cache = ResponseCache(
+            options.cache, int(options.cache_size * 1024 * 1024), options.cache_ttl
+        )
+    return _response_cache
+
+
+def new_frontier(urls: Iterable[str] = ()) -> Frontier:
+    """Returns new FIFO queue of links to visit, DiskFrontier with --store option.
+
+    Keyword Arguments:
+        urls {Iterable[str]} -- initial links (default: {()})
+
+    Returns:
+        Frontier -- queue of links to visit
+    """
+    store = get_crawl_store()
+    frontier: Frontier = (
+        deque()
+        if store is None
+        else DiskFrontier(store, get_crawl_context().options.store_cache)
+    )
+    frontier.extend(urls)
+    return frontier
+
+
+def pop_links(frontier: Frontier, count: int) -> Set[str]:
+    """Removes and returns up to <count> links from the head of <frontier>.
+
+    Arguments:
+        frontier {Frontier} -- queue of links to visit
+        count {int} -- max. number of links
+
+    Returns:
+        Set[str] -- links to visit
+    """
+    links = set()
+    while frontier and len(links) < count:
+        links.add(frontier.popleft())
+    return links
+
+
+_visited_bloom: Optional[BloomFilter] = None
+
+
+def set_visited_bloom(bloom: Optional[BloomFilter]) -> None:
+    """Sets Bloom filter in front of the sets of visited links of the current process.
+
+    Arguments:
+        bloom {Optional[BloomFilter]} -- Bloom filter, None disables it
+    """
+    global _visited_bloom  # pylint: disable=global-statement
+    _visited_bloom = bloom
+
+
+def get_visited_bloom() -> Optional[BloomFilter]:
+    """Returns Bloom filter in front of the sets of visited links of the current process.
+
+    Returns:
+        Optional[BloomFilter] -- Bloom filter, None if disabled
+    """
+    return _visited_bloom
+
+
+def new_visited_set(urls: Iterable[str] = ()) -> VisitedSet:
+    """Returns new set of visited links, DiskVisitedSet with --store option,
+    FingerprintSet with --compact-visited option,
+    with Bloom filter in front of it, if --bloom option is set.
+
+    Keyword Arguments:
+        urls {Iterable[str]} -- initial links (default: {()})
+
+    Returns:
+        VisitedSet -- set of visited links
+    """
+    options = get_crawl_context().options
+    store = get_crawl_store()
+    visited: VisitedSet
+    if store is not None:
+        visited = DiskVisitedSet(store, options.store_cache)
+    elif options.compact_visited:
+        visited = FingerprintSet()
+    else:
+        visited = set()
+    bloom = get_visited_bloom()
+    if bloom is not None:
+        visited = BloomFrontedSet(visited, bloom)
+    visited.update(urls)
+    return visited
+
+
+_returned_links: Optional[BloomFilter] = None
+
+
+def filter_returned_links(
+    result: Tuple[Set[str], PageStats]
+) -> Tuple[Set[str], PageStats]:
+    """Removes links, which the worker process already returned, from its <result>,
+    so they are not sent back over IPC again. Used with --worker-bloom option.
+
+    Arguments:
+        result {Tuple[Set[str], PageStats]} -- set of full URL links
+        and response statistics
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of links not returned yet
+        and response statistics
+    """
+    global _returned_links  # pylint: disable=global-statement
+    options = get_crawl_context().options
+    if not options.worker_bloom:
+        return result
+
+    if _returned_links is None:
+        _returned_links = BloomFilter(options.bloom_capacity, options.bloom_error)
+    returned = _returned_links
+    links = {link for link in result[0] if link not in returned}
+    for link in links:
+        returned.add(link)
+    return (links, result[1])
+
+
+class CsvResultWriter:
+    """Writes response stats of visited links into .csv file.
+
+    Rows are appended to the file as they come, so the file can be followed
+    while the crawl is running.
+    """
+
+    HEADER = ["scanned_links", "response_time", "response_status_code", "attempts", "error", "bytes"]
+
+    def __init__(self, path: str, position: int = 0) -> None:
+        """
+        Arguments:
+            path {str} -- path to the file
+
+        Keyword Arguments:
+            position {int} -- position returned by tell(), where to continue writing
+            of resumed crawl, 0 starts new file (default: {0})
+        """
+        self.path = path
+        if position:
+            self._file = open(path, mode="r+", encoding="utf-8", newline="")
+            self._file.truncate(position)
+            self._file.seek(position)
+            self._writer = csv.writer(self._file)
+        else:
+            self._file = open(path, mode="w", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.HEADER)
+
+    def write(self, rows: List[PageStats]) -> None:
+        """Writes <rows> and flushes them to the operating system.
+
+        Arguments:
+            rows {List[PageStats]} -- response stats of visited links
+        """
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def sync(self) -> None:
+        """Forces written rows to the disk."""
+        os.fsync(self._file.fileno())
+
+    def tell(self) -> int:
+        """Returns position after the last written row.
+
+        Returns:
+            int -- position in the file
+        """
+        return self._file.tell()
+
+    def close(self) -> None:
+        """Closes the file."""
+        self._file.close()
+
+
+def elapsed_ms(elapsed: timedelta) -> float:
+    """Returns response time in milliseconds.
+
+    Arguments:
+        elapsed {timedelta} -- response time
+
+    Returns:
+        float -- milliseconds
+    """
+    return elapsed / timedelta(milliseconds=1)
+
+
+class JsonLinesResultWriter(CsvResultWriter):
+    """Writes response stats of visited links into JSON Lines file,
+    one object with url, elapsed_ms, status, attempts, error and bytes per line.
+    """
+
+    def __init__(self, path: str, position: int = 0) -> None:
+        """
+        Arguments:
+            path {str} -- path to the file
+
+        Keyword Arguments:
+            position {int} -- position returned by tell(), where to continue writing
+            of resumed crawl, 0 starts new file (default: {0})
+        """
+        self.path = path
+        self._file = open(path, mode="r+" if position else "w", encoding="utf-8")
+        if position:
+            self._file.truncate(position)
+            self._file.seek(position)
+
+    def write(self, rows: List[PageStats]) -> None:
+        """Writes <rows> and flushes them to the operating system.
+
+        Arguments:
+            rows {List[PageStats]} -- response stats of visited links
+        """
+        self._file.writelines(
+            json.dumps(
+                {
+                    "url": url,
+                    "elapsed_ms": elapsed_ms(elapsed),
+                    "status": status,
+                    "attempts": attempts,
+                    "error": error,
+                    "bytes": size,
+                }
+            )
+            + "\n"
+            for url, elapsed, status, attempts, error, size in rows
+        )
+        self._file.flush()
+
+
+class SqliteResultWriter:
+    """Writes response stats of visited links into 'scanned_links' table of SQLite database,
+    all rows of one write() by one executemany() in one transaction.
+    """
+
+    def __init__(self, path: str, position: int = 0) -> None:
+        """
+        Arguments:
+            path {str} -- path to the database file
+
+        Keyword Arguments:
+            position {int} -- position returned by tell(), where to continue writing
+            of resumed crawl, 0 starts new table (default: {0})
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS scanned_links "
+            "(url TEXT NOT NULL, elapsed_ms REAL NOT NULL, status INTEGER NOT NULL, "
+            "attempts INTEGER NOT NULL, error TEXT, bytes INTEGER NOT NULL)"
+        )
+        # rowids of the rows, which are kept, are 1..position
+        self._connection.execute("DELETE FROM scanned_links WHERE rowid > ?", (position,))
+        self._connection.commit()
+        self._rows = position
+
+    def write(self, rows: List[PageStats]) -> None:
+        """Inserts <rows> and commits them.
+
+        Arguments:
+            rows {List[PageStats]} -- response stats of visited links
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO scanned_links (rowid, url, elapsed_ms, status, attempts, error, bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (self._rows + i, url, elapsed_ms(elapsed), status, attempts, error, size)
+                    for i, (url, elapsed, status, attempts, error, size) in enumerate(
+                        rows, start=1
+                    )
+                ),
+            )
+        self._rows += len(rows)
+
+    def sync(self) -> None:
+        """Committed rows are already on the disk."""
+
+    def tell(self) -> int:
+        """Returns number of written rows.
+
+        Returns:
+            int -- number of rows
+        """
+        return self._rows
+
+    def close(self) -> None:
+        """Closes the database."""
+        self._connection.close()
+
+
+class ParquetResultWriter:
+    """Writes response stats of visited links into Parquet file with columns
+    url, elapsed_ms, status, attempts, error and bytes, in row groups of <ROW_GROUP_SIZE> rows.
+
+    Parquet file is readable only after it is closed. Resumed crawl rewrites
+    the rows of the interrupted one into new file, so it needs them in memory.
+    """
+
+    ROW_GROUP_SIZE = 65536
+
+    def __init__(self, path: str, position: int = 0) -> None:
+        """
+        Arguments:
+            path {str} -- path to the file
+
+        Keyword Arguments:
+            position {int} -- position returned by tell(), where to continue writing
+            of resumed crawl, 0 starts new file (default: {0})
+        """
+        self.path = path
+        self.schema = pyarrow.schema(
+            [
+                ("url", pyarrow.string()),
+                ("elapsed_ms", pyarrow.float64()),
+                ("status", pyarrow.int32()),
+                ("attempts", pyarrow.int32()),
+                ("error", pyarrow.string()),
+                ("bytes", pyarrow.int64()),
+            ]
+        )
+        written = pq.read_table(path).slice(0, position) if position else None
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self._rows = 0
+        self._pending: List[PageStats] = []
+        if written is not None:
+            self._writer.write_table(written, row_group_size=self.ROW_GROUP_SIZE)
+            self._rows = written.num_rows
+
+    def write(self, rows: List[PageStats]) -> None:
+        """Writes <rows>, whenever there is <ROW_GROUP_SIZE> of them.
+
+        Arguments:
+            rows {List[PageStats]} -- response stats of visited links
+        """
+        self._pending.extend(rows)
+        if len(self._pending) >= self.ROW_GROUP_SIZE:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        if not self._pending:
+            return
+        urls, elapsed, statuses, attempts, errors, sizes = zip(*self._pending)
+        self._writer.write_table(
+            pyarrow.table(
+                [
+                    list(urls),
+                    [elapsed_ms(value) for value in elapsed],
+                    list(statuses),
+                    list(attempts),
+                    list(errors),
+                    list(sizes),
+                ],
+                schema=self.schema,
+            ),
+            row_group_size=self.ROW_GROUP_SIZE,
+        )
+        self._rows += len(self._pending)
+        self._pending = []
+
+    def sync(self) -> None:
+        """Parquet file is complete only after close(), nothing to force."""
+
+    def tell(self) -> int:
+        """Writes pending rows and returns number of written rows.
+
+        Returns:
+            int -- number of rows
+        """
+        self._write_row_group()
+        return self._rows
+
+    def close(self) -> None:
+        """Writes pending rows and closes the file."""
+        self._write_row_group()
+        self._writer.close()
+
+
+RESULT_WRITERS = {
+    "csv": CsvResultWriter,
+    "jsonl": JsonLinesResultWriter,
+    "sqlite": SqliteResultWriter,
+    "parquet": ParquetResultWriter,
+}
+ResultWriter = Union[CsvResultWriter, SqliteResultWriter, ParquetResultWriter]
+
+
+class CrawlResults:
+    """Response stats of visited links streamed into output file.
+
+    Stats are buffered and written in batches of <buffer_size> rows, written rows are forced
+    to the disk every <sync_every> seconds. Only running aggregates are kept in memory:
+    number of visited links, their status codes, errors, number of retried links,
+    downloaded bytes, total and max. response time.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        output_format: str = "csv",
+        buffer_size: int = 100,
+        sync_every: float = 10.0,
+    ) -> None:
+        """
+        Keyword Arguments:
+            path {Optional[str]} -- path to output file, None does not write any file (default: {None})
+            output_format {str} -- one of OUTPUT_FORMATS (default: {"csv"})
+            buffer_size {int} -- number of rows written at once (default: {100})
+            sync_every {float} -- seconds between forcing the rows to the disk (default: {10.0})
+        """
+        self.path = path
+        self.output_format = output_format
+        self.buffer_size = max(buffer_size, 1)
+        self.sync_every = sync_every
+        self.count = 0
+        self.status_codes: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.retried = 0
+        self.total_bytes = 0
+        self.total_elapsed = timedelta(seconds=0)
+        self.slowest: Optional[PageStats] = None
+        self._buffer: List[PageStats] = []
+        self._writer: Optional[ResultWriter] = None
+        self._position = 0
+        self._synced = monotonic()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, stat: PageStats) -> None:
+        """Adds response stats of visited link.
+
+        Arguments:
+            stat {PageStats} -- visited link, its response time, response code,
+            number of attempts, error and downloaded bytes
+        """
+        self.count += 1
+        self.status_codes[stat[2]] += 1
+        if stat[3] > 1:
+            self.retried += 1
+        if stat[4] is not None:
+            self.errors[stat[4]] += 1
+        self.total_bytes += stat[5]
+        self.total_elapsed += stat[1]
+        if self.slowest is None or stat[1] > self.slowest[1]:
+            self.slowest = stat
+
+        if self.path is None:
+            return
+        self._buffer.append(stat)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self, sync: bool = False) -> None:
+        """Writes buffered rows, forces them to the disk, if <sync> is set
+        or <sync_every> seconds passed since the last time.
+
+        Keyword Arguments:
+            sync {bool} -- force the rows to the disk (default: {False})
+        """
+        if self.path is None or (self._writer is None and not self._buffer):
+            # without a row, file of the interrupted crawl is left untouched
+            return
+        if self._writer is None:
+            # opened lazily, resumed crawl continues in the file of the interrupted one
+            self._writer = RESULT_WRITERS[self.output_format](self.path, self._position)
+        if self._buffer:
+            self._writer.write(self._buffer)
+            self._buffer = []
+        if sync or monotonic() - self._synced >= self.sync_every:
+            self._writer.sync()
+            self._synced = monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Writes all rows to the disk and returns the aggregates
+        with position in the output file, for checkpoint.
+
+        Returns:
+            Dict[str, Any] -- state restorable by restore()
+        """
+        self.flush(sync=True)
+        return {
+            "path": self.path,
+            "output_format": self.output_format,
+            "position": self._writer.tell() if self._writer is not None else self._position,
+            "count": self.count,
+            "status_codes": self.status_codes,
+            "errors": self.errors,
+            "retried": self.retried,
+            "total_bytes": self.total_bytes,
+            "total_elapsed": self.total_elapsed,
+            "slowest": self.slowest,
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """Restores the aggregates of snapshot(). Rows are written after the position
+        in the output file of the snapshot, the rows written behind it are dropped.
+        Raises ValueError for Parquet file, which was not closed.
+
+        Arguments:
+            snapshot {Dict[str, Any]} -- state returned by snapshot()
+        """
+        if self._writer is not None:
+            raise ValueError("Results cannot be restored after the first row was written")
+        if snapshot["output_format"] == "parquet" and snapshot["position"]:
+            # footer is written only by close(), the file of killed crawl cannot be read
+            try:
+                pq.read_metadata(snapshot["path"])
+            except (OSError, ValueError) as e:
+                raise ValueError(
+                    f"Output file '{snapshot['path']}' is not complete Parquet file. "
+                    "Crawl killed before it could close the file cannot be resumed "
+                    "with 'parquet' output format, only crawl stopped by Ctrl-C can."
+                ) from e
+        self.path = snapshot["path"]
+        self.output_format = snapshot["output_format"]
+        self._position = snapshot["position"]
+        self.count = snapshot["count"]
+        self.status_codes = snapshot["status_codes"]
+        self.errors = snapshot["errors"]
+        self.retried = snapshot["retried"]
+        self.total_bytes = snapshot["total_bytes"]
+        self.total_elapsed = snapshot["total_elapsed"]
+        self.slowest = snapshot["slowest"]
+
+    def close(self) -> None:
+        """Writes all rows to the disk and closes the output file."""
+        if self.path is None:
+            return
+        self.flush(sync=True)
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        print(f"Scanned urls saved to: '{self.path}'")
+
+
+_crawl_results = CrawlResults()
+
+
+def set_crawl_results(results: CrawlResults) -> None:
+    """Sets results of the crawl running in the current process.
+
+    Arguments:
+        results {CrawlResults} -- results object
+    """
+    global _crawl_results  # pylint: disable=global-statement
+    _crawl_results = results
+
+
+def get_crawl_results() -> CrawlResults:
+    """Returns results of the crawl running in the current process.
+
+    Returns:
+        CrawlResults -- results object
+    """
+    return _crawl_results
+
+
+CrawlState = Tuple[Iterable[str], VisitedSet, CrawlResults]
+
+
+class Checkpointer:
+    """Saves state of the running crawl into checkpoint file every <interval> seconds.
+
+    The file is gzip-compressed pickle of the seed URL, links left to visit (including links
+    in flight), visited links, stats and state of crawl trap detector, as plain data, so it does
+    not depend on the module the crawler was run as. It is replaced atomically,
+    so the crawl killed while saving leaves the previous checkpoint intact.
+
+    With --store option, the links stay in its database, which is committed only
+    with the checkpoint, and the file holds the rest.
+    """
+
+    VERSION = 5
+
+    def __init__(self, path: Optional[str] = None, interval: float = 300.0) -> None:
+        """
+        Keyword Arguments:
+            path {Optional[str]} -- path to checkpoint file, None disables checkpoints (default: {None})
+            interval {float} -- seconds between checkpoints (default: {300.0})
+        """
+        self.path = path
+        self.interval = interval
+        self._saved = monotonic()
+        self._state: Optional[Callable[[], CrawlState]] = None
+
+    def track(self, state: Callable[[], CrawlState]) -> None:
+        """Sets function returning current state of the crawl.
+
+        Arguments:
+            state {Callable[[], CrawlState]} -- returns links left to visit, visited links and stats
+        """
+        self._state = state
+
+    def tick(self) -> None:
+        """Saves checkpoint, if <interval> seconds passed since the last one."""
+        if self.path is not None and monotonic() - self._saved >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        """Saves checkpoint of the tracked crawl state."""
+        if self.path is None or self._state is None:
+            return
+
+        links, visited, stats = self._state()
+        if isinstance(visited, BloomFrontedSet):
+            visited = visited.visited
+        store = get_crawl_store()
+        frontier: Optional[List[str]] = None
+        if store is not None:
+            # visited links are in the database already
+            store.save_frontier(links)
+            visited = None
+        else:
+            # links may repeat, when the crawl is interrupted while moving them
+            frontier = list(dict.fromkeys(links))
+            if isinstance(visited, FingerprintSet):
+                visited = visited.to_bytes()
+            else:
+                visited = list(visited)
+        checkpoint = {
+            "version": self.VERSION,
+            "seed_url": get_crawl_context().seed_url,
+            "store": store is not None,
+            "frontier": frontier,
+            "visited": visited,
+            "stats": stats.snapshot(),
+            "trap_detector": get_trap_detector().state(),
+        }
+        temporary = self.path + ".tmp"
+        with gzip.open(temporary, "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.path)
+        self._saved = monotonic()
+        print(f"Checkpoint saved to: '{self.path}'")
+
+
+_checkpointer = Checkpointer()
+
+
+def set_checkpointer(checkpointer: Checkpointer) -> None:
+    """Sets checkpointer of the crawl running in the current process.
+
+    Arguments:
+        checkpointer {Checkpointer} -- checkpointer object
+    """
+    global _checkpointer  # pylint: disable=global-statement
+    _checkpointer = checkpointer
+
+
+def get_checkpointer() -> Checkpointer:
+    """Returns checkpointer of the crawl running in the current process.
+
+    Returns:
+        Checkpointer -- checkpointer object
+    """
+    return _checkpointer
+
+
+class CrawlBudget:
+    """Limits of the whole crawl: number of visited links, downloaded bytes and wall time.
+
+    When a limit is exceeded, the crawl is stopped the same way as by the first Ctrl-C:
+    no new links are scheduled, links in flight are waited for up to <drain_timeout> seconds
+    and results collected so far are saved. Links finished in the meantime are still
+    recorded, so the results can hold slightly more than <max_pages> links.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 0,
+        max_bytes: int = 0,
+        max_time: float = 0.0,
+        drain_timeout: float = 30.0,
+    ) -> None:
+        """
+        Keyword Arguments:
+            max_pages {int} -- max. number of visited links, 0 means no limit (default: {0})
+            max_bytes {int} -- max. number of downloaded bytes, 0 means no limit (default: {0})
+            max_time {float} -- max. wall time in seconds, 0 means no limit (default: {0.0})
+            drain_timeout {float} -- seconds to wait for links in flight (default: {30.0})
+        """
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+        self.drain_timeout = drain_timeout
+        self.pages = 0
+        self.bytes = 0
+        self._timer: Optional[threading.Timer] = None
+
+    def start(self) -> None:
+        """Starts measuring of the wall time."""
+        if self.max_time:
+            self._timer = threading.Timer(
+                self.max_time, self._exceed, args=(f"{self.max_time:g} s of wall time",)
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def spend(self, stat: PageStats) -> None:
+        """Counts visited link and its downloaded bytes against the limits.
+
+        Arguments:
+            stat {PageStats} -- response stats of visited link
+        """
+        self.pages += 1
+        self.bytes += stat[5]
+        if self.max_pages and self.pages >= self.max_pages:
+            self._exceed(f"{self.pages} visited links")
+        elif self.max_bytes and self.bytes >= self.max_bytes:
+            self._exceed(f"{self.bytes} downloaded bytes")
+
+    def stop(self) -> None:
+        """Stops measuring of the wall time."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _exceed(self, reason: str) -> None:
+        if is_shutting_down():
+            return
+        print(
+            f"Crawl budget exceeded by {reason}, stopping the crawl, "
+            f"waiting up to {self.drain_timeout:g} s for pages in flight."
+        )
+        request_shutdown(self.drain_timeout)
+
+
+_crawl_budget = CrawlBudget()
+
+
+def set_crawl_budget(budget: CrawlBudget) -> None:
+    """Sets budget of the crawl running in the current process.
+
+    Arguments:
+        budget {CrawlBudget} -- crawl budget object
+    """
+    global _crawl_budget  # pylint: disable=global-statement
+    _crawl_budget = budget
+
+
+def get_crawl_budget() -> CrawlBudget:
+    """Returns budget of the crawl running in the current process.
+
+    Returns:
+        CrawlBudget -- crawl budget object
+    """
+    return _crawl_budget
+
+
+def resume_crawl() -> Optional[CrawlState]:
+    """Returns state of the crawl saved in checkpoint file given by --resume option
+    and restores its crawl trap detector. Returns None, if the crawl is not resumed.
+
+    Returns:
+        Optional[CrawlState] -- links left to visit, visited links and stats
+    """
+    context = get_crawl_context()
+    path = context.options.resume
+    if path is None:
+        return None
+
+    with gzip.open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get("version") != Checkpointer.VERSION:
+        raise ValueError(f"Unsupported checkpoint version in '{path}'")
+    if checkpoint["seed_url"] != context.seed_url:
+        raise ValueError(
+            f"Checkpoint '{path}' belongs to crawl of '{checkpoint['seed_url']}', "
+            f"not '{context.seed_url}'"
+        )
+
+    store = get_crawl_store()
+    if checkpoint["store"] and store is None:
+        raise ValueError(
+            f"Checkpoint '{path}' keeps the links in the database of --store option, "
+            "resume it with the same --store"
+        )
+    results = get_crawl_results()
+    results.restore(checkpoint["stats"])
+
+    frontier: Iterable[str]
+    saved = checkpoint["visited"]
+    if checkpoint["store"]:
+        visited = new_visited_set()
+        if isinstance(visited, BloomFrontedSet):
+            for url in visited.visited:
+                visited.bloom.add(url)
+        frontier = new_frontier()
+        frontier.resume()  # type: ignore
+    elif isinstance(saved, bytes):
+        visited = new_visited_set()
+        if type(visited) is not FingerprintSet:  # pylint: disable=unidiomatic-typecheck
+            raise ValueError(
+                f"Checkpoint '{path}' holds fingerprints of visited links only, "
+                "resume it with --compact-visited and without --store and --bloom"
+            )
+        visited = FingerprintSet.from_bytes(saved)
+        frontier = checkpoint["frontier"]
+    else:
+        if store is not None:
+            # database is not cleared at the start of resumed crawl
+            store.clear()
+        visited = new_visited_set(saved)
+        frontier = checkpoint["frontier"]
+    get_trap_detector().restore(checkpoint["trap_detector"])
+    print(f"Resuming crawl from: '{path}', links left to visit: {len(frontier)}")  # type: ignore
+    return (frontier, visited, results)  # type: ignore
+
+
+def parse_retry_after(value: str) -> float:
+    """Returns number of seconds from value of Retry-After header.
+
+    Arguments:
+        value {str} -- delay in seconds or HTTP date
+
+    Returns:
+        float -- number of seconds to wait, 0 if the value cannot be parsed
+    """
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - dt.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def observe_response(
+    url: str, elapsed: timedelta, status_code: int, retry_after: Optional[str]
+) -> None:
+    """Feeds response statistics to the concurrency controller
+    and defers further requests to the host by Retry-After header of 429/503 responses.
+
+    Arguments:
+        url {str} -- requested url
+        elapsed {timedelta} -- response time
+        status_code {int} -- response status code
+        retry_after {Optional[str]} -- value of Retry-After header
+    """
+    get_concurrency_controller().record(elapsed.total_seconds(), status_code)
+    if (status_code in BACKOFF_STATUS_CODES) and retry_after:
+        get_rate_limiter().defer(url, parse_retry_after(retry_after))
+
+
+def is_html_content_type(content_type: str) -> bool:
+    """Returns True, if the value of the content-type header denotes page, which should be parsed.
+
+    Arguments:
+        content_type {str} -- value of the content-type response header
+
+    Returns:
+        bool -- True for text or html content
+    """
+    return ("text" in content_type.lower()) or ("html" in content_type.lower())
+
+
+def make_soup(html: str) -> Any:
+    """Returns parsed HTML content as <BeautifulSoup> object.
+
+    Arguments:
+        html {str} -- HTML content of the page
+
+    Returns:
+        Any -- BeautifulSoup() object
+    """
+    return BeautifulSoup(html, "lxml")
+
+
+class HrefCollector:
+    """lxml parser target collecting hrefs of internal links from parser events.
+
+    No tree is built, the parser only calls start() for every opening tag.
+    Collects the same hrefs as 'a[href^="<prefix>"], ...' css selector.
+
+    See:
+        https://lxml.de/parsing.html#the-target-parser-interface
+    """
+
+    def __init__(self, prefixes: Tuple[str, ...]) -> None:
+        """
+        Arguments:
+            prefixes {Tuple[str, ...]} -- prefixes the hrefs of internal links start with
+        """
+        self.prefixes = prefixes
+        self.hrefs: List[str] = []
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        if tag == "a":
+            href = attrib.get("href")
+            if (href is not None) and href.startswith(self.prefixes):
+                self.hrefs.append(href)
+
+    def end(self, tag: str) -> None:
+        pass
+
+    def data(self, data: str) -> None:
+        pass
+
+    def comment(self, text: str) -> None:
+        pass
+
+    def close(self) -> List[str]:
+        return self.hrefs
+
+
+def extract_hrefs(html: str, prefixes: Tuple[str, ...]) -> List[str]:
+    """Returns hrefs of internal links found in <html> without building the tree of the page.
+
+    Arguments:
+        html {str} -- HTML content of the page
+        prefixes {Tuple[str, ...]} -- prefixes the hrefs of internal links start with
+
+    Returns:
+        List[str] -- hrefs of internal links
+    """
+    parser = etree.HTMLParser(target=HrefCollector(prefixes), recover=True)
+    parser.feed(html)
+    return parser.close()
+
+
+class IncrementalHrefExtractor:
+    """Collects hrefs of internal links from chunks of the page body while it is downloading.
+
+    Chunks are decoded and fed into lxml parser with HrefCollector target one by one,
+    so the consumed bytes are discarded and the links are available before the download ends.
+    """
+
+    def __init__(
+        self,
+        prefixes: Tuple[str, ...],
+        encoding: Optional[str] = None,
+        on_hrefs: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        """
+        Arguments:
+            prefixes {Tuple[str, ...]} -- prefixes the hrefs of internal links start with
+
+        Keyword Arguments:
+            encoding {Optional[str]} -- encoding of the body, defaults to utf-8 (default: {None})
+            on_hrefs {Optional[Callable[[List[str]], None]]} -- called with newly found hrefs
+            after every chunk (default: {None})
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or "utf-8")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")
+        self.decoder = decoder(errors="replace")
+        self.collector = HrefCollector(prefixes)
+        self.parser = etree.HTMLParser(target=self.collector, recover=True)
+        self.on_hrefs = on_hrefs
+        self._emitted = 0
+
+    def _emit(self) -> None:
+        if (self.on_hrefs is not None) and (len(self.collector.hrefs) > self._emitted):
+            self.on_hrefs(self.collector.hrefs[self._emitted :])
+            self._emitted = len(self.collector.hrefs)
+
+    def feed(self, chunk: bytes) -> None:
+        """Parses next chunk of the body.
+
+        Arguments:
+            chunk {bytes} -- chunk of the body
+        """
+        self.parser.feed(self.decoder.decode(chunk))
+        self._emit()
+
+    def close(self) -> List[str]:
+        """Finishes parsing of the body. Returns hrefs of all internal links found.
+
+        Returns:
+            List[str] -- hrefs of internal links
+        """
+        self.parser.feed(self.decoder.decode(b"", final=True))
+        hrefs = self.parser.close()
+        self._emit()
+        return hrefs
+
+
+def parse_response(response: r.Response) -> Any:
+    """Returns parsed HTML content of the page from requests response
+    by the extractor selected with --extractor argument.
+
+    'stream' extractor parses the body chunk by chunk while it is downloading.
+
+    Arguments:
+        response {r.Response} -- response with not consumed body
+
+    Returns:
+        Any -- BeautifulSoup() object or list of hrefs of internal links
+    """
+    if get_crawl_context().options.extractor != "stream":
+        return parse_page(response.text)
+
+    extractor = IncrementalHrefExtractor(get_crawl_context().href_prefixes, response.encoding)
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        extractor.feed(chunk)
+    return extractor.close()
+
+
+async def parse_response_async(
+    response: Any, on_hrefs: Optional[Callable[[List[str]], None]] = None
+) -> Any:
+    """Async counterpart of parse_response() for aiohttp response.
+
+    Arguments:
+        response {aiohttp.ClientResponse} -- response with not consumed body
+
+    Keyword Arguments:
+        on_hrefs {Optional[Callable[[List[str]], None]]} -- called with hrefs found by 'stream' extractor
+        while the page is downloading (default: {None})
+
+    Returns:
+        Any -- BeautifulSoup() object or list of hrefs of internal links
+    """
+    if get_crawl_context().options.extractor != "stream":
+        return parse_page(await response.text(errors="replace"))
+
+    extractor = IncrementalHrefExtractor(
+        get_crawl_context().href_prefixes, response.charset, on_hrefs
+    )
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        extractor.feed(chunk)
+    return extractor.close()
+
+
+def parse_page(html: str) -> Any:
+    """Returns parsed HTML content of the page by the extractor selected with --extractor argument.
+
+    Arguments:
+        html {str} -- HTML content of the page
+
+    Returns:
+        Any -- BeautifulSoup() object or list of hrefs of internal links collected by 'fast' extractor
+        ('stream' extractor falls back to 'fast' for already downloaded page)
+    """
+    if get_crawl_context().options.extractor in ("fast", "stream"):
+        return extract_hrefs(html, get_crawl_context().href_prefixes)
+    return make_soup(html)
+
+
+def print_response_stats(url: str, elapsed: timedelta, status_code: int) -> None:
+    """Prints colorized response statistics of visited <url> into the console.
+
+    Arguments:
+        url {str} -- visited url
+        elapsed {timedelta} -- response time
+        status_code {int} -- response status code
+    """
+    print(
+        "URL: '{}' :: it took: '{}' :: response status: '{}'".format(
+            color_blue(url),
+            color_response_time(elapsed),
+            color_response_status(str(status_code)),
+        )
+    )
+
+
+def read_body(response: r.Response) -> Tuple[bytes, Optional[str]]:
+    """Returns raw body of the page and its encoding without parsing it.
+
+    Arguments:
+        response {r.Response} -- response with not consumed body
+
+    Returns:
+        Tuple[bytes, Optional[str]] -- body of the page and its encoding
+    """
+    return (response.content, response.encoding)
+
+
+def request_page(
+    url: str, session: r.Session, headers: Dict[str, str]
+) -> Tuple[r.Response, Optional[str]]:
+    """Sends request of one attempt to fetch <url>.
+    Returns response with not consumed body and its content-type.
+
+    With --head-first option HEAD request is sent first and GET request follows only
+    for html pages, HEAD response is returned for the other pages.
+
+    Arguments:
+        url {str} -- url to page
+        session {r.Session} -- requests.Session() object
+        headers {Dict[str, str]} -- headers of GET request
+
+    Returns:
+        Tuple[r.Response, Optional[str]] -- response and value of its content-type header
+    """
+    options = get_crawl_context().options
+    read_timeout = options.read_timeout
+    if options.page_timeout:
+        # one stalled read must not outlast the whole page
+        read_timeout = min(read_timeout, options.page_timeout)
+    timeout = (options.connect_timeout, read_timeout)
+
+    if options.head_first:
+        head = session.head(url, timeout=timeout)
+        content_type = head.headers.get("content-type")
+        if content_type is None or not is_html_content_type(content_type):
+            return (head, content_type)
+        return (session.get(url, timeout=timeout, stream=True, headers=headers), content_type)
+
+    # body is downloaded only after the content-type is known
+    response = session.get(url, timeout=timeout, stream=True, headers=headers)
+    return (response, response.headers.get("content-type"))
+
+
+def download_body(response: r.Response, deadline: float) -> None:
+    """Downloads the whole body of <response> by chunks, so it is read from memory then.
+    Raises PageTimeoutError, if the download does not finish until <deadline>.
+
+    Arguments:
+        response {r.Response} -- response with not consumed body
+        deadline {float} -- monotonic() time, until which the page must be downloaded
+    """
+    read1 = getattr(response.raw, "read1", None)
+    if read1 is None:
+        # urllib3 1.x waits for whole chunks, so the deadline is checked less often
+        body = response.iter_content(chunk_size=CHUNK_SIZE)
+    else:
+        # returns what was received so far, so slowly sent body cannot outlast the deadline
+        body = iter(partial(read1, CHUNK_SIZE, decode_content=True), b"")
+
+    chunks = []
+    try:
+        for chunk in body:
+            if monotonic() > deadline:
+                raise PageTimeoutError("page was not downloaded in --page-timeout")
+            chunks.append(chunk)
+    # raw urllib3 errors are wrapped the same way as requests does it
+    except ReadTimeoutError as e:
+        raise r.exceptions.ConnectionError(e) from e
+    except ProtocolError as e:
+        raise r.exceptions.ChunkedEncodingError(e) from e
+    # pylint: disable=protected-access
+    response._content = b"".join(chunks)
+    response._content_consumed = True
+
+
+def cook_soup(
+    url: str, session: r.Session, parse: Callable[[r.Response], Any] = parse_response
+) -> Tuple[Any, PageStats]:
+    """Returns parsed HTML content of web page on provided <url> as <BeautifulSoup> object
+    and response statistics of <url> visited.
+
+    By default one streamed GET request is sent and the body is read only for text or html content.
+    With --head-first option HEAD request is sent first and GET request follows only for html pages.
+    With --incremental option the GET request is conditional and links of not modified page
+    are loaded from the page index. With --cache option cached response is used
+    without any request.
+
+    One attempt with its body download is limited by --page-timeout, if set.
+    Connection errors, timeouts and responses with status in --retry-status are retried
+    up to --max-attempts with exponential backoff, requests to host with open circuit
+    are not sent at all. Response statistics hold number of attempts and class name
+    of the error, if the page could not be fetched. Raises CrawlShutdownError without
+    sending any request, if the crawl started shutting down before the first attempt.
+
+    Arguments:
+        url {str} -- url to page to parse
+        session {r.Session} -- requests.Session() object
+
+    Keyword Arguments:
+        parse {Callable[[r.Response], Any]} -- function parsing the response of html page,
+        e.g. read_body() to get the raw body only (default: {parse_response})
+
+    Returns:
+        Tuple[Any, PageStats] -- parsed content of the page as BeautifulSoup() object
+        and response statistics of <url> visited
+    """
+
+    def dummy(status_code: int) -> Tuple[r.Response, Any]:
+        response = r.Response()
+        response.elapsed = timedelta(seconds=0)
+        response.status_code = status_code
+        soup = make_soup("<html></html>")
+        return (response, soup)
+
+    def color_print(url: str, response_: r.Response) -> None:
+        print_response_stats(url, response_.elapsed, response_.status_code)
+
+    page_index = get_page_index()
+    headers = page_index.request_headers(url) if page_index is not None else {}
+    cache = get_response_cache()
+    cached = cache.get(url) if cache is not None else None
+    circuit_breaker = get_circuit_breaker()
+    page_timeout = get_crawl_context().options.page_timeout
+    attempts = 0
+
+    while True:
+        dummy_ = None
+        error: Optional[Exception] = None
+        response = r.Response()
+        soup = make_soup("")
+        size = 0
+
+        if cached is None:
+            if not circuit_breaker.allow(url):
+                error = CircuitOpenError(f"requests to '{urlsplit(url).netloc}' are short-circuited")
+                print(f"Func 'cook_soup': Exception encountered: {str(error)}")
+                break
+            attempts += 1
+            sleep(get_rate_limiter().reserve(url))
+            if attempts == 1 and is_shutting_down():
+                # the shutdown was requested while waiting for the rate limiter
+                raise CrawlShutdownError(url)
+        deadline = monotonic() + page_timeout
+
+        try:
+            if cached is not None:
+                response = cached
+                content_type = response.headers.get("content-type")
+            else:
+                response, content_type = request_page(url, session, headers)
+
+            if cached is None and is_retryable_status(response.status_code):
+                # body of the failed attempt is not read, not even after the last one
+                pass
+            elif response.status_code == 304:
+                # not modified since the previous crawl, its links are reused
+                soup = page_index.links(url)  # type: ignore
+            elif content_type is None:
+                raise MissingContentTypeError("'content-type'")
+            elif is_html_content_type(content_type):
+                if page_timeout and cached is None:
+                    download_body(response, deadline)
+                if page_index is not None:
+                    page_index.observe(url, response.headers)
+                if cache is not None and cached is None and response.status_code == 200:
+                    # reads the whole body, it is parsed from memory then
+                    cache.put(url, 200, response.headers, response.elapsed, response.content)
+                soup = parse(response)
+                if response.raw is not None:
+                    # bytes read from the connection
+                    size = response.raw.tell()
+            else:
+                if cache is not None and cached is None and response.status_code == 200:
+                    cache.put(url, 200, response.headers, response.elapsed)
+                dummy_ = dummy(418)
+        except Exception as e:  # pylint: disable=broad-except
+            print(f"Func 'cook_soup': Exception encountered: {str(e)}")
+            error = e
+        finally:
+            # closes the connection of not consumed non-html body without reading it
+            if response.raw is not None:
+                response.close()
+
+        if cached is not None:
+            break
+        if response.status_code is not None:
+            observe_response(
+                url, response.elapsed, response.status_code, response.headers.get("retry-after")
+            )
+        failed = isinstance(error, RETRYABLE_ERRORS) or (response.status_code or 0) >= 500
+        circuit_breaker.record(url, not failed)
+
+        if can_retry(attempts) and (
+            isinstance(error, RETRYABLE_ERRORS)
+            or (error is None and is_retryable_status(response.status_code))
+        ):
+            sleep(retry_delay(attempts))
+            continue
+        break
+
+    if error is not None:
+        status_code = response.status_code or 0
+        print_response_stats(url, timedelta(seconds=0), status_code)
+        return (
+            make_soup("<html></html>"),
+            (url, timedelta(seconds=0), status_code, attempts, type(error).__name__, 0),
+        )
+
+    if dummy_:
+        color_print(url, dummy_[0])
+        return (dummy_[1], (url, dummy_[0].elapsed, dummy_[0].status_code, attempts, None, 0))
+
+    color_print(url, response)
+    return (soup, (url, response.elapsed, response.status_code, attempts, None, size))
+
+
+def get_internal_links(
+    soup: Tuple[Any, PageStats]
+) -> Tuple[Set[str], PageStats]:
+    """Returns all internal links, which can be found in provided parsed page content, 
+    and response statistics of url visited.
+
+    Links are selected via this css filters, where hostname is the seed URL of the crawl:
+
+        'a[href^="{hostname}"], a[href^="/"]'
+
+    or, if the scope of the crawl is wider than the exact host:
+
+        'a[href^="http://"], a[href^="https://"], a[href^="/"]'
+
+    If the page was parsed by 'fast' extractor, the links are already collected.
+
+    Arguments:
+        soup {Tuple[Any, PageStats]} -- parsed page content 
+        and passed visited url statistics
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of internal hrefs (links)
+        and statistics of url visited
+    """
+    if isinstance(soup[0], list):
+        return (set(soup[0]), soup[1])
+
+    output = []
+    elements = get_crawl_context().selector.select(soup[0])
+
+    for element in elements:
+        output.append(element["href"])
+
+    return (set(output), soup[1])
+
+
+def create_full_link(context: CrawlContext, internal_link: str) -> Optional[str]:
+    """Returns full link from hostname of <context> and <internal_link> parts.
+
+    Uses urllib.parse.urljoin() method. Returned link is canonicalized by canonicalize_url()
+    and its query string is normalized by query policy of the crawl.
+
+    Arguments:
+        context {CrawlContext} -- crawl context holding the hostname part of URL
+        internal_link {str} -- part of URL parsed from webpage HTML code
+
+    Returns:
+        Optional[str] -- full URL link, None for external or malformed link
+    """
+    hostname = context.hostname
+    try:
+        internal_link_split = urlsplit(internal_link)
+        # hostname is parsed lazily and can fail as well, e.g. 'http://[oops/'
+        internal_host = internal_link_split.hostname
+    except ValueError:
+        return None
+
+    # if found internal link has netloc part
+    # check, if its host is in the scope of the crawl.
+    # If so, than consider it internal link and urljoin()
+    # full hostname and internal link that will use netloc
+    # part from internal link
+    # that is useful in case of big websites with subdomains
+    if (internal_link_split.netloc != "") and (
+        not context.is_internal_host(internal_host)
+    ):
+        return None
+
+    try:
+        full_link = urljoin(hostname, internal_link)
+    except ValueError:
+        return None
+    return context.canonicalize(full_link)
+
+
+def create_full_links(internal_links: Set[str]) -> Set[str]:
+    """Returns set of full links created from <internal_links> by create_full_link().
+
+    Arguments:
+        internal_links {Set[str]} -- internal hrefs (links) parsed from the page
+
+    Returns:
+        Set[str] -- set of full URL links
+    """
+    context = get_crawl_context()
+    full_links = {create_full_link(context, link) for link in internal_links}
+    return {link for link in full_links if link is not None}
+
+
+def select_new_links(links: Set[str], visited: VisitedSet) -> Set[str]:
+    """Returns links, which should be scheduled - not in <visited> and not crawl traps.
+
+    Arguments:
+        links {Set[str]} -- found full links
+        visited {VisitedSet} -- set of visited or already scheduled links
+
+    Returns:
+        Set[str] -- set of links to be scheduled
+    """
+    trap_detector = get_trap_detector()
+    return {
+        link for link in links if (link not in visited) and trap_detector.admit(link)
+    }
+
+
+def get_full_links(
+    soup: Tuple[Any, PageStats]
+) -> Tuple[Set[str], PageStats]:
+    """Returns set of full internal links found in parsed page content
+    and response statistics of url visited.
+
+    Arguments:
+        soup {Tuple[Any, PageStats]} -- parsed page content
+        and passed visited url statistics
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of full URL links
+        and statistics of url visited
+    """
+    links = get_internal_links(soup)
+    return (create_full_links(links[0]), links[1])
+
+
+def process_page(
+    url: str, session: r.Session
+) -> Tuple[Set[str], PageStats]:
+    """Wraps several functions under one hood.
+
+    Visits URL, gets HTML, parses it, gets internal links, converts them to full links
+    and returns them as set.
+
+    Arguments:
+        url {str} -- URL to be scanned for links.
+        session {r.Session} -- requests.Session() object
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of full URL links found on parsed page retrieved via provided <url>
+        and response statistics for visited <url>
+    """
+    links = get_full_links(cook_soup(url, session))
+    page_index = get_page_index()
+    if page_index is not None:
+        validators = page_index.pop_validators(url)
+        if links[1][2] == 200:
+            page_index.save(url, links[0], validators)
+    return links
+
+
+def process_page_or_error(
+    url: str, session: r.Session
+) -> Tuple[Set[str], PageStats]:
+    """Runs process_page(), unexpected exception of the page is returned
+    as its response statistics with the class name of the error, so it does not stop the crawl.
+    CrawlShutdownError is raised, the link was not requested.
+
+    Arguments:
+        url {str} -- URL to be scanned for links.
+        session {r.Session} -- requests.Session() object
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of full URL links found on parsed page retrieved via provided <url>
+        and response statistics for visited <url>
+    """
+    try:
+        return process_page(url, session)
+    except CrawlShutdownError:
+        raise
+    except Exception as e:  # pylint: disable=broad-except
+        print(f"Func 'process_page': Exception encountered: {str(e)}")
+        return (set(), (url, timedelta(seconds=0), 0, 0, type(e).__name__, 0))
+
+
+_worker_session: Optional[r.Session] = None
+
+
+def init_worker(
+    rate_limiter: Any = None,
+    concurrency_controller: Any = None,
+    context: Optional[CrawlContext] = None,
+    circuit_breaker: Any = None,
+    shutdown_event: Any = None,
+) -> None:
+    """Initializes long-lived worker process of the 'persistent' engine.
+
+    Every worker keeps its own requests.Session() object for its whole lifetime,
+    so the connections to the site are reused between the tasks.
+
+    Keyword Arguments:
+        rate_limiter {Any} -- rate limiter shared by all workers (default: {None})
+        concurrency_controller {Any} -- concurrency controller shared by all workers (default: {None})
+        context {Optional[CrawlContext]} -- crawl context (default: {None})
+        circuit_breaker {Any} -- circuit breaker shared by all workers (default: {None})
+        shutdown_event {Any} -- event set on shutdown of the crawl (default: {None})
+    """
+    global _worker_session  # pylint: disable=global-statement
+    _worker_session = start_session()
+    init_process(rate_limiter, concurrency_controller, context, circuit_breaker, shutdown_event)
+
+
+def process_page_in_worker(url: str) -> Tuple[Set[str], PageStats]:
+    """Runs process_page() with the session of the long-lived worker process.
+
+    Arguments:
+        url {str} -- URL to be scanned for links.
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of full URL links found on parsed page retrieved via provided <url>
+        and response statistics for visited <url>
+    """
+    if _worker_session is None:
+        init_worker()
+    return filter_returned_links(process_page_or_error(url, _worker_session))
+
+
+def start_worker_pool(workers: Optional[int] = None) -> Pool:
+    """Returns pool of long-lived worker processes, which is shared by all crawl levels.
+
+    Keyword Arguments:
+        workers {Optional[int]} -- number of worker processes, defaults to cpu count (default: {None})
+
+    Returns:
+        Pool -- multiprocessing pool object
+    """
+    return get_context("spawn").Pool(
+        processes=workers,
+        initializer=init_worker,
+        initargs=(
+            get_rate_limiter(),
+            get_concurrency_controller(),
+            get_crawl_context(),
+            get_circuit_breaker(),
+            get_shutdown_event(),
+        ),
+    )
+
+
+def collect_results(
+    results: Iterator[Tuple[Set[str], PageStats]]
+) -> Iterator[Tuple[Set[str], PageStats]]:
+    """Yields results of Pool.imap_unordered() <results> one by one as they finish,
+    until the shutdown deadline, or all of them, if the crawl is not shutting down.
+
+    Arguments:
+        results {Iterator[Tuple[Set[str], PageStats]]} -- results iterator
+
+    Returns:
+        Iterator[Tuple[Set[str], PageStats]] -- finished results
+    """
+    while True:
+        try:
+            yield results.next(timeout=0.5)  # type: ignore
+        except StopIteration:
+            return
+        except CrawlShutdownError:
+            # link was not requested, it is left in the batch
+            continue
+        except PoolTimeoutError:
+            if drain_time_left() == 0:
+                return
+
+
+def pool(
+    links_to_visit: Tuple[Set[str], PageStats],
+    session: r.Session,
+    visited: VisitedSet,
+    stats: CrawlResults,
+    worker_pool: Optional[Pool] = None,
+    next_level: Optional[Frontier] = None,
+) -> Tuple[
+    Tuple[Set[str], PageStats],
+    VisitedSet,
+    CrawlResults,
+]:
+    """Runs process_page() func as worker using multiprocessing module for all links.
+    Returns new links to scan, visited links and request stats for visited links.
+
+    If <worker_pool> is provided, links are processed by its long-lived workers,
+    otherwise new pool with one process per link is created.
+
+    Every result is recorded as soon as its page is finished: the stats are written,
+    the page is removed from <links_to_visit> and its new links are marked as visited
+    and added into <next_level>, if provided, then the checkpoint is saved, if it is due.
+    Links left in <links_to_visit> were not finished before the shutdown deadline.
+
+    Args:
+        links_to_visit (Tuple[Set[str], PageStats]): URL links to scan and request stat for URL
+        session (r.Session): session object
+        visited (VisitedSet): set of visited links
+        stats (CrawlResults): links response stats
+        worker_pool (Optional[Pool], optional): pool of long-lived workers. Defaults to None.
+        next_level (Optional[Frontier], optional): frontier for the new links,
+        otherwise they are returned. Defaults to None.
+
+    Returns:
+        Tuple[ Tuple[Set[str], PageStats], Set[str], CrawlResults, ]: 
+        ((set of links to visit, url's response stats), set of visited urls, response stats of visited urls)
+    """
+    found: Set[str] = set()
+    add_links = found.update if next_level is None else next_level.extend
+
+    def record(results: Iterator[Tuple[Set[str], PageStats]]) -> None:
+        for links, stat in collect_results(results):
+            visited.add(stat[0])
+            stats.add(stat)
+            get_crawl_budget().spend(stat)
+            # links left were not finished before the shutdown deadline
+            links_to_visit[0].discard(stat[0])
+            new_links = select_new_links(links, visited)
+            # links scheduled for the next level are not found again by the next pages
+            visited.update(new_links)
+            add_links(new_links)
+            get_checkpointer().tick()
+
+    if worker_pool is not None:
+        record(worker_pool.imap_unordered(process_page_in_worker, list(links_to_visit[0])))
+    else:
+        with get_context("spawn").Pool(
+            maxtasksperchild=1,
+            initializer=init_process,
+            initargs=(
+                get_rate_limiter(),
+                get_concurrency_controller(),
+                get_crawl_context(),
+                get_circuit_breaker(),
+                get_shutdown_event(),
+            ),
+        ) as p:
+            record(
+                p.imap_unordered(
+                    partial(process_page_or_error, session=session), list(links_to_visit[0])
+                )
+            )
+
+    return ((found, links_to_visit[1]), visited, stats)
+
+
+def start_crawl(session: r.Session) -> CrawlState:
+    """Returns state of the crawl resumed from checkpoint, or of new crawl
+    with the seed page recorded and links found on it scheduled.
+
+    Arguments:
+        session {r.Session} -- session object
+
+    Returns:
+        CrawlState -- links to visit, visited links and stats
+    """
+    resumed = resume_crawl()
+    if resumed is not None:
+        return resumed
+
+    seed_url = get_crawl_context().seed_url
+    results = get_crawl_results()
+    try:
+        root = process_page_or_error(seed_url, session)
+    except CrawlShutdownError:
+        # seed is left to visit, so it stays in checkpoint
+        return ({seed_url}, new_visited_set([seed_url]), results)
+    results.add(root[1])
+    get_crawl_budget().spend(root[1])
+    visited = new_visited_set([root[1][0]])
+    links_to_visit = select_new_links(root[0], visited)
+    visited.update(links_to_visit)
+    return (links_to_visit, visited, results)
+
+
+# pylint: disable=dangerous-default-value
+def looper_with_pool(
+    session: r.Session,
+    visited: Union[Set[Any], Set[str]] = set(),
+    links_to_visit: Union[None, Tuple[Set[str], PageStats]] = None,
+    worker_pool: Optional[Pool] = None,
+) -> CrawlResults:
+    """Loops pool() funs until there is no unvisited link left or the crawl is shutting down.
+    Returns response stats of visited links.
+
+    Links of one level are scheduled together, with --store option in batches
+    of --store-cache links, so the level does not have to fit into memory.
+    Links of the batch scheduled before the shutdown are still waited for.
+
+    Args:
+        session (r.Session): session object
+        visited (Union[Set[Any], Set[str]], optional): set of visited links. Defaults to set().
+        links_to_visit (Union[None, Tuple[Set[str], PageStats]], optional): links to be scanned. Defaults to None.
+        worker_pool (Optional[Pool], optional): pool of long-lived workers. Defaults to None.
+
+    Returns:
+        CrawlResults: response stats of visited links
+    """
+    links, visited, stats = start_crawl(session)
+    frontier = new_frontier(links)
+    next_level = new_frontier()
+    batch: Set[str] = set()
+    options = get_crawl_context().options
+    checkpointer = get_checkpointer()
+    checkpointer.track(lambda: (chain(batch, frontier, next_level), visited, stats))
+
+    while True:
+        print(f"Found new links to scan: {len(frontier)}")
+        if not frontier:
+            break
+
+        next_level = new_frontier()
+        batch_size = options.store_cache if options.store else len(frontier)
+        while frontier and not is_shutting_down():
+            batch = pop_links(frontier, batch_size)
+            pool(
+                (batch, (options.hostname, timedelta(seconds=0), 0, 0, None, 0)),
+                session,
+                visited,
+                stats,
+                worker_pool,
+                next_level,
+            )
+        if is_shutting_down():
+            break
+        frontier = next_level
+
+    return stats
+
+
+def wait_for_result(
+    completed: queue.Queue,
+) -> Union[None, str, Tuple[Set[str], PageStats]]:
+    """Returns next result of the page in flight from <completed> queue,
+    None if the shutdown deadline passed before it finished.
+
+    Arguments:
+        completed {queue.Queue} -- queue of results
+
+    Returns:
+        Union[None, str, Tuple[Set[str], PageStats]] -- set of full URL links
+        and response statistics of the page, or the link itself,
+        if it was not requested because of the shutdown
+    """
+    while True:
+        try:
+            return completed.get(timeout=0.5)
+        except queue.Empty:
+            if drain_time_left() == 0:
+                return None
+
+
+def looper_streaming(session: r.Session, worker_pool: Pool) -> CrawlResults:
+    """Crawls the site with long-lived workers of <worker_pool> until there is no unvisited link left
+    or the crawl is shutting down. Returns response stats of visited links.
+
+    Unlike looper_with_pool() there are no barriers between the crawl levels. Links found
+    on a finished page are scheduled immediately and picked up by the first idle worker,
+    so one slow page does not stall the whole crawl. Number of links in flight is limited
+    by the concurrency controller.
+
+    Args:
+        session (r.Session): session object
+        worker_pool (Pool): pool of long-lived workers
+
+    Returns:
+        CrawlResults: response stats of visited links
+    """
+    completed: queue.Queue = queue.Queue()
+
+    def on_error(link: str, e: BaseException) -> None:
+        if isinstance(e, CrawlShutdownError):
+            # link is handed back, so it stays in checkpoint
+            completed.put(link)
+            return
+        print(f"Func 'looper_streaming': Exception encountered: {str(e)}")
+        completed.put((set(), (link, timedelta(seconds=0), 0, 0, type(e).__name__, 0)))
+
+    def submit(link: str) -> None:
+        in_flight.add(link)
+        worker_pool.apply_async(
+            process_page_in_worker,
+            (link,),
+            callback=completed.put,
+            error_callback=lambda e, link=link: on_error(link, e),
+        )
+
+    links_to_visit, visited, stats = start_crawl(session)
+    pending = new_frontier(links_to_visit)
+    in_flight: Set[str] = set()
+    controller = get_concurrency_controller()
+    checkpointer = get_checkpointer()
+    checkpointer.track(lambda: (chain(in_flight, pending), visited, stats))
+
+    print(f"Found new links to scan: {len(pending)}")
+
+    while True:
+        limit = controller.get_limit()
+        while pending and len(in_flight) < limit and not is_shutting_down():
+            submit(pending.popleft())
+
+        if not in_flight:
+            break
+
+        result = wait_for_result(completed)
+        if result is None:
+            break
+        if isinstance(result, str):
+            # link not requested because of the shutdown
+            in_flight.discard(result)
+            pending.append(result)
+            continue
+        links, stat = result
+        stats.add(stat)
+        get_crawl_budget().spend(stat)
+
+        new_links = select_new_links(links, visited)
+        if new_links:
+            print(f"Found new links to scan: {len(new_links)}")
+        pending.extend(new_links)
+        visited.update(new_links)
+        in_flight.discard(stat[0])
+        checkpointer.tick()
+
+    return stats
+
+
+def decode_body(body: bytes, encoding: Optional[str]) -> str:
+    """Returns <body> decoded by <encoding>, utf-8 if it is not known.
+
+    Arguments:
+        body {bytes} -- body of the page
+        encoding {Optional[str]} -- encoding of the body
+
+    Returns:
+        str -- HTML content of the page
+    """
+    try:
+        return body.decode(encoding or "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def parse_body(
+    body: bytes,
+    encoding: Optional[str],
+    stats: PageStats,
+    validators: Optional[Tuple[Optional[str], Optional[str]]] = None,
+) -> Tuple[Set[str], PageStats]:
+    """Parses raw body of the page in the parse process of the 'pipeline' engine.
+    Returns set of full links found in the page and response statistics of the page.
+
+    Arguments:
+        body {bytes} -- body of the page
+        encoding {Optional[str]} -- encoding of the body, defaults to utf-8
+        stats {PageStats} -- response statistics of the page
+
+    Keyword Arguments:
+        validators {Optional[Tuple[Optional[str], Optional[str]]]} -- ETag and Last-Modified
+        of the page saved with its links into the page index (default: {None})
+
+    Returns:
+        Tuple[Set[str], PageStats] -- set of full URL links and statistics of url visited
+    """
+    links = get_full_links((parse_page(decode_body(body, encoding)), stats))
+    page_index = get_page_index()
+    if page_index is not None and validators is not None:
+        page_index.save(stats[0], links[0], validators)
+    return filter_returned_links(links)
+
+
+def init_parse_worker(context: CrawlContext) -> None:
+    """Initializes parse process of the 'pipeline' engine.
+
+    Arguments:
+        context {CrawlContext} -- crawl context
+    """
+    ignore_sigint()
+    set_crawl_context(context)
+
+
+def start_parse_pool(workers: Optional[int] = None) -> Pool:
+    """Returns pool of parse processes of the 'pipeline' engine.
+
+    Keyword Arguments:
+        workers {Optional[int]} -- number of parse processes, defaults to cpu count (default: {None})
+
+    Returns:
+        Pool -- multiprocessing pool object
+    """
+    return get_context("spawn").Pool(
+        processes=workers, initializer=init_parse_worker, initargs=(get_crawl_context(),)
+    )
+
+
+def looper_pipeline(
+    session: r.Session, parse_pool: Pool, fetchers: int, parse_queue_size: int
+) -> CrawlResults:
+    """Crawls the site with pipeline of fetch threads and parse processes
+    until there is no unvisited link left or the crawl is shutting down.
+    Returns response stats of visited links.
+
+    <fetchers> threads download the pages and hand the raw bodies over to <parse_pool>,
+    so waiting for the network and parsing do not block each other and both can be sized
+    independently. At most <parse_queue_size> bodies wait for parsing, then the fetch threads wait.
+    At most twice <fetchers> links wait for the fetch threads, the rest stays in the frontier.
+
+    Args:
+        session (r.Session): session object
+        parse_pool (Pool): pool of parse processes
+        fetchers (int): number of fetch threads
+        parse_queue_size (int): max. number of bodies waiting for parsing
+
+    Returns:
+        CrawlResults: response stats of visited links
+    """
+    frontier: queue.Queue = queue.Queue()
+    completed: queue.Queue = queue.Queue()
+    parse_slots = threading.BoundedSemaphore(max(parse_queue_size, 1))
+
+    def on_parsed(result: Tuple[Set[str], PageStats]) -> None:
+        parse_slots.release()
+        completed.put(result)
+
+    def on_error(stat: PageStats, e: BaseException) -> None:
+        parse_slots.release()
+        print(f"Func 'looper_pipeline': Exception encountered: {str(e)}")
+        completed.put((set(), stat))
+
+    page_index = get_page_index()
+
+    def fetcher() -> None:
+        session_ = start_session()
+        while True:
+            url = frontier.get()
+            if url is None:
+                break
+            try:
+                page, stat = cook_soup(url, session_, read_body)
+            except CrawlShutdownError:
+                # link is handed back to the main thread, so it stays in checkpoint
+                completed.put(url)
+                continue
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"Func 'looper_pipeline': Exception encountered: {str(e)}")
+                completed.put((set(), (url, timedelta(seconds=0), 0, 0, type(e).__name__, 0)))
+                continue
+            if isinstance(page, list):
+                # links of page not modified since the previous crawl
+                completed.put(get_full_links((page, stat)))
+            elif isinstance(page, tuple):
+                validators = page_index.pop_validators(url) if page_index is not None else None
+                parse_slots.acquire()  # pylint: disable=consider-using-with
+                parse_pool.apply_async(
+                    parse_body,
+                    (page[0], page[1], stat, validators),
+                    callback=on_parsed,
+                    error_callback=lambda e, stat=stat: on_error(stat, e),
+                )
+            else:
+                # error or non-html page, nothing to parse
+                completed.put((set(), stat))
+        close_session(session_)
+
+    links_to_visit, visited, stats = start_crawl(session)
+    pending = new_frontier(links_to_visit)
+    in_flight: Set[str] = set()
+    checkpointer = get_checkpointer()
+    checkpointer.track(lambda: (chain(in_flight, pending), visited, stats))
+
+    print(f"Found new links to scan: {len(pending)}")
+
+    threads = [threading.Thread(target=fetcher, daemon=True) for _ in range(fetchers)]
+    for thread in threads:
+        thread.start()
+
+    while True:
+        if is_shutting_down():
+            # links not picked up by the fetch threads yet are left unvisited
+            while True:
+                try:
+                    link = frontier.get_nowait()
+                except queue.Empty:
+                    break
+                in_flight.discard(link)
+                pending.append(link)
+        else:
+            while pending and len(in_flight) < 2 * fetchers:
+                link = pending.popleft()
+                in_flight.add(link)
+                frontier.put(link)
+
+        if not in_flight:
+            break
+
+        result = wait_for_result(completed)
+        if result is None:
+            break
+        if isinstance(result, str):
+            # link not requested because of the shutdown
+            in_flight.discard(result)
+            pending.append(result)
+            continue
+        links, stat = result
+        stats.add(stat)
+        get_crawl_budget().spend(stat)
+
+        new_links = select_new_links(links, visited)
+        if new_links:
+            print(f"Found new links to scan: {len(new_links)}")
+        pending.extend(new_links)
+        visited.update(new_links)
+        in_flight.discard(stat[0])
+        checkpointer.tick()
+
+    for _ in threads:
+        frontier.put(None)
+    for thread in threads:
+        # fetch threads still busy after the shutdown deadline are abandoned
+        thread.join(drain_time_left())
+
+    return stats
+
+
+async def cook_soup_async(
+    url: str,
+    client: Any,
+    semaphore: AdaptiveSemaphore,
+    on_hrefs: Optional[Callable[[List[str]], None]] = None,
+) -> Tuple[Any, PageStats]:
+    """Async counterpart of cook_soup(). Returns parsed HTML content of web page on provided <url>
+    as <BeautifulSoup> object and response statistics of <url> visited.
+
+    One GET request is sent per attempt; the body is read only for text or html content.
+    One attempt with its body download is limited by --page-timeout, if set.
+    Failed fetches are retried and the shutdown is checked the same way as in cook_soup().
+
+    Arguments:
+        url {str} -- url to page to parse
+        client {aiohttp.ClientSession} -- aiohttp client session object
+        semaphore {AdaptiveSemaphore} -- limits number of concurrent fetches
+
+    Keyword Arguments:
+        on_hrefs {Optional[Callable[[List[str]], None]]} -- called with hrefs found by 'stream' extractor
+        while the page is downloading (default: {None})
+
+    Returns:
+        Tuple[Any, PageStats] -- parsed content of the page as BeautifulSoup() object
+        and response statistics of <url> visited
+    """
+    elapsed = timedelta(seconds=0)
+    status_code = 0
+    soup = make_soup("<html></html>")
+    page_index = get_page_index()
+    headers = page_index.request_headers(url) if page_index is not None else {}
+    cache = get_response_cache()
+    cached = cache.get(url) if cache is not None else None
+
+    if cached is not None:
+        if is_html_content_type(cached.headers["content-type"]):
+            if page_index is not None:
+                page_index.observe(url, cached.headers)
+            elapsed = cached.elapsed
+            status_code = cached.status_code
+            soup = parse_page(cached.text)
+        else:
+            status_code = 418
+        print_response_stats(url, elapsed, status_code)
+        return (soup, (url, elapsed, status_code, 0, None, 0))
+
+    retryable_errors = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+    circuit_breaker = get_circuit_breaker()
+    options = get_crawl_context().options
+    timeout = aiohttp.ClientTimeout(
+        total=options.page_timeout or None,
+        sock_connect=options.connect_timeout,
+        sock_read=options.read_timeout,
+    )
+    attempts = 0
+
+    while True:
+        elapsed = timedelta(seconds=0)
+        status_code = 0
+        size = 0
+        error: Optional[Exception] = None
+        retry_status = False
+
+        if not circuit_breaker.allow(url):
+            error = CircuitOpenError(f"requests to '{urlsplit(url).netloc}' are short-circuited")
+            print(f"Func 'cook_soup_async': Exception encountered: {str(error)}")
+            break
+        attempts += 1
+        await asyncio.sleep(get_rate_limiter().reserve(url))
+        if attempts == 1 and is_shutting_down():
+            # the shutdown was requested while waiting for the rate limiter
+            raise CrawlShutdownError(url)
+
+        async with semaphore:
+            start = dt.now()
+            try:
+                async with client.get(url, timeout=timeout, headers=headers) as response:
+                    elapsed = dt.now() - start
+                    status_code = response.status
+                    observe_response(
+                        url, elapsed, response.status, response.headers.get("retry-after")
+                    )
+                    content_type = response.headers.get("content-type")
+                    if is_retryable_status(response.status):
+                        # body of the failed attempt is not read, not even after the last one
+                        retry_status = True
+                    elif response.status == 304:
+                        # not modified since the previous crawl, its links are reused
+                        soup = page_index.links(url)  # type: ignore
+                    elif content_type is None:
+                        raise MissingContentTypeError("'content-type'")
+                    elif is_html_content_type(content_type):
+                        if page_index is not None:
+                            page_index.observe(url, response.headers)
+                        if cache is not None and response.status == 200:
+                            # whole body is needed for the cache, it is parsed from memory then
+                            body = await response.read()
+                            cache.put(url, 200, response.headers, elapsed, body)
+                            soup = parse_page(decode_body(body, response.charset))
+                        else:
+                            soup = await parse_response_async(response, on_hrefs)
+                        size = response.content.total_bytes
+                    else:
+                        if cache is not None and response.status == 200:
+                            cache.put(url, 200, response.headers, elapsed)
+                        elapsed = timedelta(seconds=0)
+                        status_code = 418
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"Func 'cook_soup_async': Exception encountered: {str(e)}")
+                error = e
+
+        failed = isinstance(error, retryable_errors) or status_code >= 500
+        circuit_breaker.record(url, not failed)
+
+        if can_retry(attempts) and (retry_status or isinstance(error, retryable_errors)):
+            await asyncio.sleep(retry_delay(attempts))
+            continue
+        break
+
+    if error is not None:
+        print_response_stats(url, timedelta(seconds=0), status_code)
+        return (
+            make_soup("<html></html>"),
+            (url, timedelta(seconds=0), status_code, attempts, type(error).__name__, 0),
+        )
+
+    print_response_stats(url, elapsed, status_code)
+    return (soup, (url, elapsed, status_code, attempts, None, size))
+
+
+async def crawl_async(hostname: str, concurrency: int) -> CrawlResults:
+    """Crawls the site starting at <hostname> on one asyncio event loop
+    until there is no unvisited link left or the crawl is shutting down.
+
+    Newly found links are queued immediately and picked up by <concurrency> worker tasks,
+    so there are no barriers between the crawl levels. With 'stream' extractor the links
+    are queued even before the page finishes downloading. Number of concurrent fetches
+    is limited by the concurrency controller. At most twice <concurrency> links wait
+    for the worker tasks, the rest stays in the frontier.
+
+    Arguments:
+        hostname {str} -- URL hostname to start the crawl from
+        concurrency {int} -- max. number of concurrent fetches
+
+    Returns:
+        CrawlResults -- response stats of visited links
+    """
+    frontier: asyncio.Queue = asyncio.Queue(maxsize=2 * concurrency)
+    # links in the queue or being fetched
+    scheduled: Set[str] = set()
+    resumed = resume_crawl()
+    if resumed is None:
+        visited = new_visited_set([hostname])
+        stats = get_crawl_results()
+        pending = new_frontier([hostname])
+    else:
+        links, visited, stats = resumed
+        pending = new_frontier(links)
+    checkpointer = get_checkpointer()
+    checkpointer.track(lambda: (chain(scheduled, pending), visited, stats))
+    page_index = get_page_index()
+    semaphore = AdaptiveSemaphore(get_concurrency_controller())
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as client:
+
+        def refill() -> None:
+            while pending and not frontier.full() and not is_shutting_down():
+                link = pending.popleft()
+                scheduled.add(link)
+                frontier.put_nowait(link)
+
+        def enqueue(links: Set[str]) -> None:
+            for link in select_new_links(links, visited):
+                pending.append(link)
+                visited.add(link)
+            refill()
+
+        def on_hrefs(hrefs: List[str]) -> None:
+            enqueue(create_full_links(set(hrefs)))
+
+        async def worker() -> None:
+            while True:
+                url = await frontier.get()
+                try:
+                    links, stat = get_full_links(
+                        await cook_soup_async(url, client, semaphore, on_hrefs)
+                    )
+                    if page_index is not None:
+                        validators = page_index.pop_validators(url)
+                        if stat[2] == 200:
+                            page_index.save(url, links, validators)
+                    stats.add(stat)
+                    get_crawl_budget().spend(stat)
+                    enqueue(links)
+                    # cancelled fetches stay scheduled, so they are saved in checkpoint
+                    scheduled.discard(url)
+                except CrawlShutdownError:
+                    # not requested, stays scheduled as well
+                    pass
+                except Exception as e:  # pylint: disable=broad-except
+                    # e.g. locked page index, the page is recorded as failed like in the other engines
+                    print(f"Func 'crawl_async': Exception encountered: {str(e)}")
+                    stat = (url, timedelta(seconds=0), 0, 0, type(e).__name__, 0)
+                    stats.add(stat)
+                    get_crawl_budget().spend(stat)
+                    scheduled.discard(url)
+                finally:
+                    # queue must not run empty while links are pending, or join() returns
+                    refill()
+                    frontier.task_done()
+                    checkpointer.tick()
+
+        refill()
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        joined = asyncio.ensure_future(frontier.join())
+        while not joined.done() and not is_shutting_down():
+            await asyncio.wait([joined], timeout=0.5)
+            for task in workers:
+                if task.done():
+                    # worker failed even to record the error, e.g. the output file is not writable,
+                    # join() would never return without it
+                    task.result()
+        if not joined.done():
+            # queued links are left unvisited, fetches in flight are waited for until the deadline
+            while not frontier.empty():
+                frontier.get_nowait()
+                frontier.task_done()
+            await asyncio.wait([joined], timeout=drain_time_left())
+            joined.cancel()
+
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    return stats
+
+
+def looper_async() -> CrawlResults:
+    """Runs crawl_async() on new event loop.
+    Returns response stats of visited links.
+
+    Returns:
+        CrawlResults -- response stats of visited links
+    """
+    if aiohttp is None:
+        print("The 'async' engine requires 'aiohttp' package to be installed.")
+        sys.exit(1)
+    context = get_crawl_context()
+    return asyncio.run(crawl_async(context.seed_url, context.options.concurrency))
+
+
+def new_results_path(output_format: str = "csv") -> str:
+    """Returns timestamped path of file with found URLs stats.
+
+    Keyword Arguments:
+        output_format {str} -- one of OUTPUT_FORMATS (default: {"csv"})
+
+    Returns:
+        str -- path to the file
+    """
+    filename = f"scanned_links.{OUTPUT_EXTENSIONS[output_format]}"
+    timestamp = dt.now().strftime("%Y%m%d_%H%M%S")
+    return "_".join([timestamp, filename])
+
+
+def save_skipped_urls(skipped: Dict[str, str]) -> None:
+    """Saves URLs skipped as crawl traps with the reasons into .csv file
+    and prints number of them per reason.
+
+    Arguments:
+        skipped {Dict[str, str]} -- skipped URLs and the reasons
+    """
+    if not skipped:
+        return
+
+    filename = "skipped_links.csv"
+    timestamp = dt.now().strftime("%Y%m%d_%H%M%S")
+    filepath = "_".join([timestamp, filename])
+
+    with open(filepath, mode="w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["skipped_links", "reason"])
+        for link in skipped.items():
+            writer.writerow(link)
+
+    print(f"No. of URLs skipped as crawl traps: {len(skipped)}")
+    for reason, count in Counter(skipped.values()).most_common():
+        print(f"  {reason}: {count}")
+    print(f"Skipped urls saved to: '{filepath}'")
+
+
+def print_bloom_stats(bloom: Optional[BloomFilter]) -> None:
+    """Prints outcomes of the checks of Bloom filter in front of the set of visited links.
+
+    Arguments:
+        bloom {Optional[BloomFilter]} -- Bloom filter, None if disabled
+    """
+    if bloom is None:
+        return
+
+    stats = bloom.stats
+    negatives = stats["checks"] - stats["possibly_visited"]
+    false_positive_rate = stats["false_positives"] / max(
+        negatives + stats["false_positives"], 1
+    )
+    print(
+        f"Bloom filter: {stats['checks']} checks, {negatives} surely new, "
+        f"{stats['possibly_visited']} possibly visited, "
+        f"{stats['false_positives']} false positives ({false_positive_rate:.4%})"
+    )
+
+
+def pretty_print(visited: CrawlResults) -> None:
+    """PrettyPrints summary of all found URLs on the site from the running aggregates.
+
+    Arguments:
+        visited {CrawlResults} -- response stats of all found URLs on the site
+    """
+    printer = PrettyPrinter(indent=2)
+    printer.pprint({"Response status codes": dict(visited.status_codes.most_common())})
+    if visited.errors:
+        printer.pprint({"Errors": dict(visited.errors.most_common())})
+    print(f"No. of URLs scanned: {len(visited)}")
+    print(f"No. of URLs retried: {visited.retried}")
+    print(f"Downloaded bytes: {visited.total_bytes}")
+    if visited.slowest is not None:
+        print(f"Average response time: {visited.total_elapsed / len(visited)}")
+        print(f"Slowest response: {visited.slowest[0]} ({visited.slowest[1]})")
+
+
+def crawl(context: CrawlContext) -> CrawlResults:
+    """Crawls the site by the engine selected in options of <context>.
+    Returns response stats of visited links.
+
+    Entry point for using the crawler as a library, e.g.:
+
+        crawl(CrawlContext("https://www.ihned.cz", parse_arguments(["--engine", "async", "https://www.ihned.cz"])))
+
+    Arguments:
+        context {CrawlContext} -- crawl context
+
+    Returns:
+        CrawlResults -- response stats of visited links
+    """
+    options = context.options
+    if options.output_format == "parquet" and pyarrow is None:
+        print("The 'parquet' output format requires 'pyarrow' package to be installed.")
+        sys.exit(1)
+    reset_shutdown()
+    set_crawl_context(context)
+    set_trap_detector(
+        TrapDetector(
+            options.max_depth,
+            options.max_segment_repeats,
+            options.max_template_urls,
+            options.max_query_variants,
+        )
+    )
+    set_visited_bloom(
+        BloomFilter(options.bloom_capacity, options.bloom_error) if options.bloom else None
+    )
+    checkpointer = Checkpointer(options.checkpoint or options.resume, options.checkpoint_every)
+    store = None
+    if options.store:
+        # committed with the checkpoints only, so the killed crawl can be resumed
+        store = CrawlStore(options.store, 0 if checkpointer.path else 1000)
+        if not options.resume:
+            store.clear()
+    set_crawl_store(store)
+    set_checkpointer(checkpointer)
+    results = CrawlResults(
+        options.output or new_results_path(options.output_format),
+        options.output_format,
+        options.output_buffer,
+        options.fsync_every,
+    )
+    set_crawl_results(results)
+    budget = CrawlBudget(
+        options.max_pages, options.max_bytes, options.max_time, options.drain_timeout
+    )
+    set_crawl_budget(budget)
+    budget.start()
+    try:
+        visited = crawl_with_engine(options)
+        if is_shutting_down():
+            print("The crawl was stopped before all links were visited.")
+        # links left after the shutdown, otherwise resuming this checkpoint only restores the results
+        checkpointer.save()
+        return visited
+    except (KeyboardInterrupt, SystemExit):
+        checkpointer.save()
+        raise
+    finally:
+        budget.stop()
+        results.close()
+        set_crawl_store(None)
+        if store is not None:
+            store.close()
+
+
+def crawl_with_engine(options: argparse.Namespace) -> CrawlResults:
+    """Runs the engine selected in <options> of the crawl context already set.
+    Returns response stats of visited links.
+
+    Arguments:
+        options {argparse.Namespace} -- crawl options
+
+    Returns:
+        CrawlResults -- response stats of visited links
+    """
+    if options.engine == "async":
+        set_rate_limiter(HostRateLimiter(options.host_rate, options.host_burst))
+        set_concurrency_controller(
+            ConcurrencyController(*get_concurrency_limits(options.concurrency))
+        )
+        set_circuit_breaker(CircuitBreaker(options.breaker_failures, options.breaker_cooldown))
+        return looper_async()
+
+    # workers skip links queued before the shutdown
+    set_shutdown_event(get_context("spawn").Event())
+    with start_manager() as manager:
+        # pyre-ignore
+        set_rate_limiter(manager.HostRateLimiter(options.host_rate, options.host_burst))
+        workers = options.workers or os.cpu_count() or 1
+        # pyre-ignore
+        set_concurrency_controller(
+            manager.ConcurrencyController(*get_concurrency_limits(workers))
+        )
+        # pyre-ignore
+        set_circuit_breaker(
+            manager.CircuitBreaker(options.breaker_failures, options.breaker_cooldown)
+        )
+        session = start_session()
+        if options.engine == "persistent":
+            with start_worker_pool(options.workers) as worker_pool:
+                if options.scheduler == "stream":
+                    visited = looper_streaming(session, worker_pool)
+                else:
+                    visited = looper_with_pool(session, worker_pool=worker_pool)
+        elif options.engine == "pipeline":
+            with start_parse_pool(options.workers) as parse_pool:
+                visited = looper_pipeline(
+                    session, parse_pool, options.fetchers, options.parse_queue_size
+                )
+        else:
+            visited = looper_with_pool(session)
+        close_session(session)
+
+    return visited
 
 
 def main() -> None:
     """Main func.
     """
+    arguments = get_arguments()
     start_sigint_catching()
     start_coloring()
-    session = start_session()
-    visited = looper_with_pool(session)
-    close_session(session)
+    visited = crawl(CrawlContext(arguments.hostname, arguments))
     pretty_print(visited)
-    save_urls(visited)
+    save_skipped_urls(get_trap_detector().skipped)
+    print_bloom_stats(get_visited_bloom())
 
 
 if __name__ == "__main__":
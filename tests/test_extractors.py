@@ -0,0 +1,110 @@
+"""Tests of 'fast' and 'stream' link extractors against the css selector of 'soup' extractor.
+
+Every page of the corpus must give the same hrefs, in the same order, from extract_hrefs()
+and from IncrementalHrefExtractor fed with the body split into chunks of various sizes,
+as the precompiled selector of CrawlContext selects from the BeautifulSoup tree.
+"""
+from typing import List, Tuple
+
+import pytest
+
+from script import CrawlContext, IncrementalHrefExtractor, extract_hrefs, make_soup, parse_arguments
+
+SEED = "https://www.example.com"
+
+CORPUS = {
+    "plain": """<!DOCTYPE html><html><head><title>t</title></head><body>
+        <a href="/a">a</a> <a href="https://www.example.com/b">b</a>
+        <a href="http://www.example.com/c">c</a> <a href="https://cdn.example.com/d">d</a>
+        <a href="https://other.org/e">e</a> <a href="relative/f">f</a> <a href="#top">g</a>
+        <a href="mailto:x@example.com">h</a> <a>no href</a> <a href="">empty</a>
+        <a href=" /space">space</a> <link href="/not-a-link"> <area href="/area">
+        </body></html>""",
+    "uppercase_tags": """<HTML><BODY><A HREF="/upper">x</A><a Href="/mixed">y</a>
+        <A hReF="HTTPS://WWW.EXAMPLE.COM/loud">z</A><a HREF='/single'>w</a></BODY></HTML>""",
+    "entities": """<p><a href="/q?a=1&amp;b=2">amp</a><a href="/caf&eacute;">named</a>
+        <a href="&#47;numeric">numeric</a><a href="&#x2F;hex">hex</a>
+        <a href="/q?a=1&b=2&copy=3">bare</a><a href="/&lt;lt&gt;">lt</a>
+        <a href="https&#58;//www.example.com/colon">colon</a></p>""",
+    "svg_template_noscript": """<body>
+        <svg><a href="/svg-link"><text>s</text></a><a xlink:href="/xlink">x</a></svg>
+        <math><a href="/math-link">m</a></math>
+        <template><a href="/in-template">t</a></template>
+        <noscript><a href="/in-noscript">n</a></noscript>
+        <iframe><a href="/in-iframe">i</a></iframe>
+        <textarea><a href="/in-textarea">ta</a></textarea>
+        <title><a href="/in-title">ti</a></title>
+        </body>""",
+    "comments": """<body><!-- <a href="/commented">c</a> -->
+        <a href="/after-comment">a</a><!--> <a href="/odd-comment">o</a> -->
+        <!-- unclosed <a href="/in-unclosed">u</a>
+        </body>""",
+    "scripts": """<head><script>document.write('<a href="/script">s</a>');</script>
+        <style>a[href="/style"] { color: red }</style></head>
+        <body><script type="text/template"><a href="/template-script">t</a></script>
+        <a href="/after-script">a</a></body>""",
+    "nested_anchors": """<body><a href="/outer"><a href="/inner">in</a> rest</a>
+        <a href="/first" href="/second">dup</a>
+        <a href=/unquoted>u</a><a href="/unclosed">
+        <div><a href="/in-div"><span><a href="/in-span">s</a></span></a></div></body>""",
+    "nul_bytes": """<body><a href="/nul\x00byte">n</a>te\x00xt<a href="/after-nul">a</a>
+        <a\x00 href="/tag-nul">t</a></body>""",
+    "broken": """<a href="/no-html-tag">x</a><p><a href="/unclosed-p">y<td><a href="/stray-td">z
+        <a href="/tail""",
+    "non_ascii": """<body><a href="/čeština">č</a><a href="/日本語">j</a>
+        <a href="https://www.example.com/emoji-😀">e</a></body>""",
+}
+
+SCOPES = {
+    "exact": ["--scope", "exact"],
+    "domain": ["--scope", "domain"],
+}
+
+CHUNK_SIZES = (1, 2, 3, 7, 64, 4096)
+
+
+def context_for(scope: str) -> CrawlContext:
+    """Returns crawl context of <SEED> with <scope>."""
+    return CrawlContext(SEED, parse_arguments(SCOPES[scope] + [SEED]))
+
+
+def selected_hrefs(context: CrawlContext, html: str) -> List[str]:
+    """Returns hrefs selected by 'soup' extractor."""
+    return [element["href"] for element in context.selector.select(make_soup(html))]
+
+
+def split(data: bytes, size: int) -> List[bytes]:
+    """Returns <data> split into chunks of <size> bytes."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def cases() -> List[Tuple[str, str]]:
+    return [(scope, page) for scope in SCOPES for page in CORPUS]
+
+
+@pytest.mark.parametrize("scope,page", cases())
+def test_extract_hrefs_matches_selector(scope: str, page: str) -> None:
+    context = context_for(scope)
+    html = CORPUS[page]
+    assert extract_hrefs(html, context.href_prefixes) == selected_hrefs(context, html)
+
+
+@pytest.mark.parametrize("scope,page", cases())
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+def test_incremental_extractor_matches_selector(scope: str, page: str, size: int) -> None:
+    context = context_for(scope)
+    html = CORPUS[page]
+    found: List[str] = []
+    extractor = IncrementalHrefExtractor(context.href_prefixes, "utf-8", found.extend)
+    # byte-split chunks cut multi-byte characters, tags and entities
+    for chunk in split(html.encode("utf-8"), size):
+        extractor.feed(chunk)
+    hrefs = extractor.close()
+    assert hrefs == selected_hrefs(context, html)
+    # hrefs are reported while feeding exactly once
+    assert found == hrefs
+
+
+def test_corpus_is_not_trivial() -> None:
+    context = context_for("domain")
+    assert all(selected_hrefs(context, html) for html in CORPUS.values())